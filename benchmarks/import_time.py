@@ -0,0 +1,75 @@
+"""
+    flight_route_plotter cold-start import benchmark
+
+    Imports the package in fresh interpreters and checks the median wall time against a
+    budget, and that no heavy backend (numpy, geographiclib) is loaded by the import itself:
+
+        python benchmarks/import_time.py
+        python benchmarks/import_time.py --budget-ms 50 --runs 21
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# median cold import time of the package allowed by default, in milliseconds
+IMPORT_BUDGET_MS = 75.0
+
+# modules that must only be imported once a mode needing them is used
+LAZY_MODULES = ("numpy", "geographiclib", "geopy", "pytz")
+
+PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+print(json.dumps({{"ms": elapsed * 1e3, "loaded": [m for m in {lazy!r} if m in sys.modules]}}))
+"""
+
+
+def measure(module, runs):
+    """
+    * Method to import a module in fresh interpreters
+    ***
+        :params module: module name
+        :params runs: number of interpreters
+    * return list of import times in ms, sorted list of heavy modules loaded by the import
+    """
+    env = dict(os.environ, PYTHONPATH=ROOT + os.pathsep + os.environ.get("PYTHONPATH", ""))
+    code = PROBE.format(module=module, lazy=LAZY_MODULES)
+    times, loaded = [], set()
+    for _ in range(runs):
+        output = subprocess.check_output([sys.executable, "-c", code], env=env, cwd=ROOT)
+        result = json.loads(output.decode())
+        times.append(result["ms"])
+        loaded.update(result["loaded"])
+    return times, sorted(loaded)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--module", default="flight_route_plotter", help="module to import")
+    parser.add_argument("--runs", type=int, default=11, help="number of fresh interpreters")
+    parser.add_argument("--budget-ms", type=float, default=IMPORT_BUDGET_MS, help="allowed median import time")
+    args = parser.parse_args(argv)
+
+    times, loaded = measure(args.module, args.runs)
+    median = statistics.median(times)
+    print("import %s: median %.1f ms, min %.1f ms, max %.1f ms over %d runs (budget %.1f ms)"
+          % (args.module, median, min(times), max(times), len(times), args.budget_ms))
+    failed = False
+    if loaded:
+        print("FAIL: import loaded %s" % ", ".join(loaded))
+        failed = True
+    if median > args.budget_ms:
+        print("FAIL: median import time over budget")
+        failed = True
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
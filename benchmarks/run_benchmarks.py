@@ -0,0 +1,281 @@
+"""
+    flight_route_plotter benchmark suite
+
+    Times the pipeline stages on fixed route sets and writes the results to a JSON file
+    so that releases can be compared:
+
+        python benchmarks/run_benchmarks.py --output bench.json
+        python benchmarks/run_benchmarks.py --quick --compare bench.json
+"""
+import argparse
+import json
+import math
+import os
+import platform
+import random
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np  # noqa: E402
+
+from flight_route_plotter import suncalc_v2  # noqa: E402
+from flight_route_plotter.batch import get_flight_route_data_many  # noqa: E402
+from flight_route_plotter.flight_locator import get_flight_route_data, process_positional_data  # noqa: E402
+
+# average gate to gate speed used to derive arrival times, km/h
+CRUISE_SPEED = 850.0
+
+AIRPORTS = {
+    "LHR": (51.4700, -0.4543), "CDG": (49.0097, 2.5479), "JFK": (40.6413, -73.7781),
+    "BOS": (42.3656, -71.0096), "SIN": (1.3644, 103.9915), "KUL": (2.7456, 101.7072),
+    "EWR": (40.6895, -74.1745), "PER": (-31.9385, 115.9672), "AKL": (-37.0082, 174.7850),
+    "DOH": (25.2731, 51.6081), "HKG": (22.3080, 113.9185), "ORD": (41.9742, -87.9073),
+    "PEK": (40.0799, 116.6031), "DXB": (25.2532, 55.3657), "LAX": (33.9416, -118.4085),
+    "SYD": (-33.9399, 151.1753), "NRT": (35.7720, 140.3929), "SFO": (37.6213, -122.3790),
+    "HNL": (21.3187, -157.9225), "ANC": (61.1743, -149.9962), "LYR": (78.2461, 15.4656),
+    "FRA": (50.0379, 8.5622), "HKT": (8.1111, 98.3065), "MAD": (40.4983, -3.5676),
+    "BCN": (41.2974, 2.0833), "SCL": (-33.3930, -70.7858),
+}
+
+ROUTE_SETS = {
+    "short_haul": [("LHR", "CDG"), ("JFK", "BOS"), ("SIN", "KUL"), ("MAD", "BCN")],
+    "transatlantic": [("JFK", "LHR"), ("LHR", "JFK"), ("FRA", "ORD"), ("BOS", "MAD")],
+    "ultra_long_haul": [("SIN", "JFK"), ("SIN", "EWR"), ("PER", "LHR"), ("AKL", "DOH")],
+    "polar": [("JFK", "HKG"), ("ORD", "PEK"), ("DXB", "LAX"), ("LYR", "ANC")],
+    "antimeridian": [("SYD", "LAX"), ("NRT", "SFO"), ("AKL", "HNL"), ("HKG", "SCL")],
+}
+
+# departure times covering both hemispheres' seasons and all times of day
+DEPARTURES = [datetime(2020, 1, 15, 2, tzinfo=timezone.utc), datetime(2020, 4, 14, 8, tzinfo=timezone.utc),
+              datetime(2020, 6, 21, 14, tzinfo=timezone.utc), datetime(2020, 10, 2, 20, tzinfo=timezone.utc)]
+
+
+def _great_circle_km(a, b):
+    lat1, lon1, lat2, lon2 = map(math.radians, (a[0], a[1], b[0], b[1]))
+    h = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 2 * 6371.009 * math.asin(math.sqrt(h))
+
+
+def _flight(a, b, departure):
+    duration = timedelta(hours=max(_great_circle_km(a, b), 50.0) / CRUISE_SPEED)
+    return (a[0], a[1], departure.strftime("%Y%m%dT%H:%M:%SZ"),
+            b[0], b[1], (departure + duration).strftime("%Y%m%dT%H:%M:%SZ"))
+
+
+def get_route_set_flights(name):
+    """
+    * Method to get the flights of a fixed route set, every route flown at every benchmark departure
+    """
+    return [_flight(AIRPORTS[origin], AIRPORTS[destination], departure)
+            for origin, destination in ROUTE_SETS[name] for departure in DEPARTURES]
+
+
+def get_batch_flights(size, seed=2020):
+    """
+    * Method to get a reproducible batch of random flights between the benchmark airports
+    """
+    rng = random.Random(seed)
+    codes = sorted(AIRPORTS)
+    flights = []
+    while len(flights) < size:
+        origin, destination = rng.sample(codes, 2)
+        departure = datetime(2020, 1, 1, tzinfo=timezone.utc) + timedelta(minutes=rng.randrange(366 * 24 * 60))
+        flights.append(_flight(AIRPORTS[origin], AIRPORTS[destination], departure))
+    return flights
+
+
+def measure(function, repeat):
+    """
+    * Method to time a callable
+    ***
+        :params function: callable returning the number of processed items (flights, points...)
+        :params repeat: number of timed runs, the best one is reported
+    * return dict with best/mean wall time in seconds, items per run and peak traced memory in bytes
+    """
+    times = []
+    items = 0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        items = function()
+        times.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    function()
+    peak_memory = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    best = min(times)
+    return {"best_s": best, "mean_s": sum(times) / len(times), "items": items,
+            "items_per_s": items / best if best else None, "peak_memory_bytes": peak_memory}
+
+
+def bench_route_set(flights, repeat, options):
+    points = []
+
+    def run():
+        del points[:]
+        for flight in flights:
+            points.append(len(get_flight_route_data(*flight, **options)["enroute_coordinates"]))
+        return len(flights)
+
+    result = measure(run, repeat)
+    result["flights_per_s"] = result.pop("items_per_s")
+    result["points"] = sum(points)
+    result["points_per_s"] = sum(points) / result["best_s"]
+    return result
+
+
+def bench_get_position(size, repeat):
+    rng = np.random.default_rng(1)
+    timestamps = rng.uniform(1.5e9, 1.9e9, size)
+    latitudes = rng.uniform(-89, 89, size)
+    longitudes = rng.uniform(-180, 180, size)
+    dates = [datetime.fromtimestamp(ts, timezone.utc) for ts in timestamps.tolist()]
+    points = list(zip(dates, latitudes.tolist(), longitudes.tolist()))
+
+    def scalar():
+        for date, lat, lng in points:
+            suncalc_v2.getPosition(date, lat, lng)
+        return size
+
+    def batch():
+        suncalc_v2.getPositions(timestamps, latitudes, longitudes)
+        return size
+
+    return {"scalar": measure(scalar, repeat), "batch": measure(batch, repeat)}
+
+
+def bench_get_times(size, repeat):
+    rng = random.Random(2)
+    points = [(datetime(2020, 1, 1) + timedelta(days=rng.randrange(366)), rng.uniform(-60, 60),
+               rng.uniform(-180, 180)) for _ in range(size)]
+
+    def run():
+        for date, lat, lng in points:
+            suncalc_v2.getTimes(date, lat, lng)
+        return size
+
+    return measure(run, repeat)
+
+
+def bench_process_positional_data(size, repeat):
+    # a synthetic night->day->night profile of `size` samples
+    start = datetime(2020, 4, 14, 8, tzinfo=timezone.utc)
+    altitudes = np.sin(np.linspace(-1.0, 2 * math.pi + 1.0, size)).tolist()
+    times = [start + timedelta(seconds=40 * index) for index in range(size)]
+
+    def make_travel_info():
+        coordinates_list = [{"azimuth": 0.0, "altitude": altitude, "index": index, "time_at_c": times[index],
+                             "enroute_sunrise_lat": 0.0, "enroute_sunrise_long": 0.0}
+                            for index, altitude in enumerate(altitudes)]
+        return {"start": "night", "end": "night", "total_duration": 40 * size, "coordinates_list": coordinates_list}
+
+    # travel_info is consumed by every call, so the input is rebuilt outside the timed section
+    times_taken = []
+    for _ in range(repeat):
+        travel_info = make_travel_info()
+        begin = time.perf_counter()
+        process_positional_data(travel_info, times[0], times[-1])
+        times_taken.append(time.perf_counter() - begin)
+    best = min(times_taken)
+    return {"best_s": best, "mean_s": sum(times_taken) / len(times_taken), "items": size, "items_per_s": size / best}
+
+
+def run_benchmarks(quick=False, batch_size=10000, executor="serial", options=None):
+    """
+    * Method to run the whole suite
+    ***
+        :params quick: fewer repetitions and a smaller batch, for smoke runs
+        :params batch_size: number of flights of the batch benchmark
+        :params executor: executor of the batch benchmark
+        :params options: keyword arguments passed to get_flight_route_data
+    * return dict of results
+    """
+    options = options or {}
+    repeat = 1 if quick else 5
+    if quick:
+        batch_size = min(batch_size, 500)
+
+    results = {
+        "meta": {
+            "created": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "options": options,
+            "quick": quick,
+        },
+        "route_sets": {},
+    }
+    for name in ROUTE_SETS:
+        results["route_sets"][name] = bench_route_set(get_route_set_flights(name), repeat, options)
+
+    batch = get_batch_flights(batch_size)
+
+    def run_batch():
+        get_flight_route_data_many(batch, executor=executor, **options)
+        return len(batch)
+
+    results["batch"] = measure(run_batch, 1)
+    results["batch"]["flights_per_s"] = results["batch"].pop("items_per_s")
+    results["batch"]["executor"] = executor
+
+    results["getPosition"] = bench_get_position(2000 if quick else 20000, repeat)
+    results["getTimes"] = bench_get_times(200 if quick else 2000, repeat)
+    results["process_positional_data"] = bench_process_positional_data(1500, repeat)
+    return results
+
+
+def compare(results, baseline):
+    """
+    * Method to print the speed ratio of every benchmark against a previous results file
+    """
+    def walk(current, previous, path):
+        for key, value in current.items():
+            if key == "meta" or key not in previous:
+                continue
+            if isinstance(value, dict) and "best_s" in value:
+                ratio = previous[key]["best_s"] / value["best_s"] if value["best_s"] else float("inf")
+                flag = "  REGRESSION" if ratio < 0.9 else ""
+                print("%-45s %8.3fx%s" % ("/".join(path + [key]), ratio, flag))
+            elif isinstance(value, dict):
+                walk(value, previous[key], path + [key])
+
+    walk(results, baseline, [])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--output", default="bench_results.json", help="JSON file to write the results to")
+    parser.add_argument("--quick", action="store_true", help="single repetition and a 500 flight batch")
+    parser.add_argument("--batch-size", type=int, default=10000)
+    parser.add_argument("--executor", default="serial", choices=["serial", "thread", "process"])
+    parser.add_argument("--crossing-tolerance", type=float, default=None)
+    parser.add_argument("--compare", help="previous results file to compare against")
+    args = parser.parse_args(argv)
+
+    options = {}
+    if args.crossing_tolerance is not None:
+        options["crossing_tolerance"] = args.crossing_tolerance
+    results = run_benchmarks(args.quick, args.batch_size, args.executor, options)
+
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+    for name, result in results["route_sets"].items():
+        print("%-20s %9.1f flights/s %12.0f points/s  peak %6.1f MB" % (
+            name, result["flights_per_s"], result["points_per_s"], result["peak_memory_bytes"] / 1e6))
+    print("%-20s %9.1f flights/s" % ("batch", results["batch"]["flights_per_s"]))
+    print("results written to %s" % args.output)
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(results, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,2 +1,5 @@
 from .suncalc_v2 import *
 from . flight_locator import *
+from . batch import *
+from . ephemeris import *
+from . profiling import *
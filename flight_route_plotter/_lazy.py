@@ -0,0 +1,46 @@
+"""
+    flight_route_plotter lazy import file
+"""
+import importlib
+
+__all__ = ["lazy_import"]
+
+
+class _LazyModule(object):
+    """
+    * Stand-in for a module that is only imported on first attribute access
+    ***
+        :params name: absolute module name
+
+    After the import the module's namespace is copied onto the stand-in, so later attribute
+    lookups are plain instance dict hits.
+    """
+
+    def __init__(self, name):
+        self.__dict__["_lazy_name"] = name
+        self.__dict__["_lazy_module"] = None
+
+    def _load(self):
+        module = self.__dict__["_lazy_module"]
+        if module is None:
+            module = importlib.import_module(self.__dict__["_lazy_name"])
+            self.__dict__.update(module.__dict__)
+            self.__dict__["_lazy_module"] = module
+        return module
+
+    def __getattr__(self, name):
+        return getattr(self._load(), name)
+
+    def __repr__(self):
+        state = "loaded" if self.__dict__["_lazy_module"] is not None else "not loaded"
+        return "<lazy module %r (%s)>" % (self.__dict__["_lazy_name"], state)
+
+
+def lazy_import(name):
+    """
+    * Method to get a module that is imported the first time one of its attributes is used
+    ***
+        :params name: absolute module name, e.g. "numpy"
+    * return module stand-in
+    """
+    return _LazyModule(name)
@@ -0,0 +1,194 @@
+"""
+    flight_route_plotter asyncio file
+"""
+import asyncio
+import copy
+import os
+
+from . batch import _get_executor, _get_flight_args
+from . flight_locator import get_flight_route_result
+
+__all__ = ["AsyncRouteService"]
+
+
+def _call(function, args, options):
+    return function(*args, **options)
+
+
+def _copy_result(result):
+    """
+    * Method to give a request its own RouteResult out of a computation shared with other requests
+    ***
+        :params result: shared RouteResult
+    * return shallow copy with its own events list, the arrays still being shared
+    """
+    result = copy.copy(result)
+    result.events = list(result.events)
+    return result
+
+
+def _get_request_key(function, args, options):
+    """
+    * Method to get the key under which identical requests are merged
+    * return hashable key or None when an argument is not hashable
+    """
+    key = (function.__name__, args, tuple(sorted(options.items())))
+    try:
+        hash(key)
+    except TypeError:
+        return None
+    return key
+
+
+class AsyncRouteService(object):
+    """
+    * Runs route computations on an executor without blocking the event loop
+    ***
+        :params executor: "thread", "process" or a concurrent.futures Executor, a process pool keeps the
+                          GIL free for the event loop
+        :params max_workers: number of workers of a new executor, defaults to the number of CPUs
+        :params max_in_flight: maximum number of computations submitted to the executor at once, further
+                               requests wait on the event loop, defaults to max_workers
+        :params timeout: default timeout in seconds of a request, None for none
+        :params ephemeris: path of a saved EphemerisTable loaded by the workers
+
+    Identical concurrent requests (same arguments and options) share one computation, a dict result
+    being built from the shared RouteResult for every request. Cancelling
+    or timing out a request only cancels the computation once no other request waits for it, and
+    a computation already running on a worker keeps its in-flight slot until it finishes.
+
+        async with AsyncRouteService(max_in_flight=8) as service:
+            data = await service.get_flight_route_data(51.47, -0.4543, "20190207T20:20:00Z",
+                                                       8.1111, 98.3065, "20190208T07:05:00Z", timeout=5)
+    """
+
+    def __init__(self, executor="process", max_workers=None, max_in_flight=None, timeout=None, ephemeris=None):
+        max_workers = max_workers or os.cpu_count() or 1
+        self._executor, self._owns_executor = _get_executor(executor, max_workers, ephemeris)
+        self.max_in_flight = max_in_flight or max_workers
+        self.timeout = timeout
+        self._semaphore = None
+        self._loop = None
+        # request key -> [task, number of waiting requests]
+        self._in_flight = {}
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self.close()
+        return False
+
+    def close(self, wait=False):
+        """
+        * Method to cancel the pending computations and shut down an executor created by the service
+        """
+        for task, _ in list(self._in_flight.values()):
+            task.cancel()
+        self._in_flight.clear()
+        if self._owns_executor:
+            self._executor.shutdown(wait=wait, cancel_futures=True)
+
+    @property
+    def in_flight(self):
+        """
+        * Number of distinct computations pending or running
+        """
+        return len(self._in_flight)
+
+    def _get_semaphore(self):
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop = loop
+            self._semaphore = asyncio.Semaphore(self.max_in_flight)
+        return self._semaphore
+
+    async def _compute(self, function, args, options):
+        """
+        * Method to run a computation on the executor once an in-flight slot is free
+        """
+        semaphore = self._get_semaphore()
+        await semaphore.acquire()
+        loop = asyncio.get_running_loop()
+        try:
+            future = self._executor.submit(_call, function, args, options)
+        except BaseException:
+            semaphore.release()
+            raise
+
+        def release(_):
+            # the slot is freed when the worker is done, not when the waiting task is cancelled
+            try:
+                loop.call_soon_threadsafe(semaphore.release)
+            except RuntimeError:
+                pass
+
+        future.add_done_callback(release)
+        return await asyncio.wrap_future(future)
+
+    async def _request(self, function, args, options, timeout):
+        key = _get_request_key(function, args, options)
+        entry = self._in_flight.get(key) if key is not None else None
+        if entry is None:
+            entry = [asyncio.ensure_future(self._compute(function, args, options)), 0]
+            if key is not None:
+                self._in_flight[key] = entry
+
+                def forget(task):
+                    if self._in_flight.get(key, (None,))[0] is task:
+                        del self._in_flight[key]
+
+                entry[0].add_done_callback(forget)
+        task = entry[0]
+        entry[1] += 1
+        try:
+            return await asyncio.wait_for(asyncio.shield(task), self.timeout if timeout is None else timeout)
+        finally:
+            entry[1] -= 1
+            if entry[1] == 0 and not task.done():
+                task.cancel()
+
+    async def get_flight_route_data(self, start_latitide, start_longitude, start_datetime, end_latitude,
+                                    end_longitude, end_datetime, timeout=None, **options):
+        """
+        * Method to find sun's position during flight without blocking the event loop
+        ***
+            :params timeout: seconds after which asyncio.TimeoutError is raised, defaults to the service's
+            :params options: keyword arguments passed to get_flight_route_data, e.g. crossing_tolerance
+        * return get_flight_route_data result
+        """
+        args = (start_latitide, start_longitude, start_datetime, end_latitude, end_longitude, end_datetime)
+        return (await self._request(get_flight_route_result, args, options, timeout)).to_dict()
+
+    async def get_flight_route_result(self, start_latitide, start_longitude, start_datetime, end_latitude,
+                                      end_longitude, end_datetime, timeout=None, **options):
+        """
+        * Method to find sun's position during flight as a RouteResult without blocking the event loop
+        * return get_flight_route_result result
+
+        Merged requests get separate RouteResult objects whose arrays are shared, so they must not be
+        modified in place.
+        """
+        args = (start_latitide, start_longitude, start_datetime, end_latitude, end_longitude, end_datetime)
+        return _copy_result(await self._request(get_flight_route_result, args, options, timeout))
+
+    async def get_flight_route_data_many(self, flights, timeout=None, as_route_result=False, **options):
+        """
+        * Method to find sun's position during many flights, each flight being a separate request
+        ***
+            :params flights: sequence of flight records as accepted by batch.get_flight_route_data_many
+            :params timeout: timeout of each flight
+            :params as_route_result: return RouteResult objects instead of dicts, their arrays being shared with
+                                    merged requests
+        * return list of results in input order, a failed or timed out flight gives {"error": message}
+        """
+        async def request(flight):
+            try:
+                result = await self._request(get_flight_route_result, _get_flight_args(flight), options, timeout)
+                return _copy_result(result) if as_route_result else result.to_dict()
+            except asyncio.CancelledError:
+                raise
+            except Exception as exc:
+                return {"error": "%s: %s" % (type(exc).__name__, exc)}
+
+        return list(await asyncio.gather(*[request(flight) for flight in flights]))
@@ -0,0 +1,153 @@
+"""
+    flight_route_plotter batch processing file
+"""
+import math
+import os
+from concurrent import futures
+
+from . ephemeris import _using_ephemeris, use_ephemeris
+from . flight_locator import get_flight_route_data, get_flight_route_result
+from . route_geometry import RouteGeometryPool
+
+__all__ = ["FLIGHT_FIELDS", "get_flight_route_data_many"]
+
+# argument order of get_flight_route_data, with the short column names also accepted in flight records
+FLIGHT_FIELDS = (
+    ("start_latitide", "start_latitude", "start_lat"),
+    ("start_longitude", "start_long", "start_lon"),
+    ("start_datetime",),
+    ("end_latitude", "end_lat"),
+    ("end_longitude", "end_long", "end_lon"),
+    ("end_datetime",),
+)
+
+
+def _get_flight_args(flight):
+    """
+    * Method to get get_flight_route_data arguments from a flight record
+    ***
+        :params flight: sequence in get_flight_route_data argument order or mapping of column name to value
+    * return tuple of the six positional arguments
+    """
+    if not hasattr(flight, "keys"):
+        args = tuple(flight)
+        if len(args) != len(FLIGHT_FIELDS):
+            raise ValueError("flight must have %d fields, got %d" % (len(FLIGHT_FIELDS), len(args)))
+        return args
+    args = []
+    for names in FLIGHT_FIELDS:
+        for name in names:
+            if name in flight:
+                args.append(flight[name])
+                break
+        else:
+            raise KeyError("flight has no %s field" % names[0])
+    return tuple(args)
+
+
+def _iter_flights(flights):
+    """
+    * Method to iterate over the flight records of a sequence or DataFrame-like table
+    ***
+        :params flights: sequence of flight records or object with columns and to_dict("records")
+    * return iterator of flight records
+    """
+    if hasattr(flights, "columns") and hasattr(flights, "to_dict"):
+        return iter(flights.to_dict("records"))
+    return iter(flights)
+
+
+def _check_options(options):
+    """
+    * Method to check the options of a batch of flights
+    ***
+        :params options: keyword arguments passed to get_flight_route_data
+    """
+    if "geometry" in options:
+        raise ValueError("geometry cannot be given for a batch, every city pair gets its own RouteGeometry")
+
+
+def _process_chunk(chunk, options, as_route_result=False):
+    """
+    * Method to process a chunk of flights, catching failures per flight
+    ***
+        :params chunk: list of flight records
+        :params options: keyword arguments passed to get_flight_route_data
+        :params as_route_result: return RouteResult objects instead of dicts
+    * return list of results, failed flights give a dict with an "error" key
+
+    Flights of the chunk flying the same city pair share its RouteGeometry.
+    """
+    function = get_flight_route_result if as_route_result else get_flight_route_data
+    geometries = RouteGeometryPool(backend=options.get("geometry_backend", "ellipsoidal"))
+    results = []
+    for flight in chunk:
+        try:
+            args = _get_flight_args(flight)
+            geometry = geometries.get((args[0], args[1]), (args[3], args[4]))
+            results.append(function(*args, geometry=geometry, **options))
+        except Exception as exc:
+            results.append({"error": "%s: %s" % (type(exc).__name__, exc)})
+    return results
+
+
+def _get_executor(executor, max_workers, ephemeris=None):
+    """
+    * Method to get the concurrent.futures executor for a backend name
+    ***
+        :params executor: "thread", "process" or an Executor instance
+        :params max_workers: number of workers for a new executor
+        :params ephemeris: ephemeris table path loaded by every new worker process
+    * return executor and whether it was created here (and has to be shut down)
+    """
+    if isinstance(executor, futures.Executor):
+        return executor, False
+    if executor == "thread":
+        return futures.ThreadPoolExecutor(max_workers=max_workers), True
+    if executor == "process":
+        if ephemeris is None:
+            return futures.ProcessPoolExecutor(max_workers=max_workers), True
+        return futures.ProcessPoolExecutor(max_workers=max_workers, initializer=use_ephemeris, initargs=(ephemeris,)), True
+    raise ValueError("unknown executor %r, expected 'serial', 'thread', 'process' or an Executor" % (executor,))
+
+
+def get_flight_route_data_many(flights, executor="serial", max_workers=None, chunksize=None, as_route_result=False,
+                               ephemeris=None, **options):
+    """
+    * Method to find sun's position during many flights
+    ***
+        :params flights: sequence of flight records or DataFrame-like table, a record is either the six
+                         get_flight_route_data arguments in order or a mapping with their names
+                         (start_lat/start_long/end_lat/end_long are accepted too)
+        :params executor: "serial", "thread", "process" or a concurrent.futures Executor
+        :params max_workers: number of workers, defaults to the number of CPUs
+        :params chunksize: number of flights sent to a worker at once, defaults to about 4 chunks per worker
+        :params as_route_result: return compact RouteResult objects instead of dicts
+        :params ephemeris: path of a saved EphemerisTable, memory-mapped by the workers (a caller supplied
+                           Executor has to load it itself, e.g. with use_ephemeris as initializer); the serial
+                           and thread executors use it in the whole process during the call only
+        :params options: keyword arguments passed to get_flight_route_data except geometry, e.g. crossing_tolerance
+    * return list of get_flight_route_data results in input order, a failed flight gives {"error": message}
+    """
+    _check_options(options)
+    flights = list(_iter_flights(flights))
+    # flights in this process use the table for this call only, worker processes load it themselves
+    with _using_ephemeris(ephemeris if executor in ("serial", "thread") else None):
+        if executor == "serial":
+            return _process_chunk(flights, options, as_route_result)
+
+        max_workers = max_workers or os.cpu_count() or 1
+        if not chunksize:
+            chunksize = max(1, int(math.ceil(len(flights) / (max_workers * 4.0))))
+        chunks = [flights[i:i + chunksize] for i in range(0, len(flights), chunksize)]
+
+        pool, owned = _get_executor(executor, max_workers, ephemeris)
+        try:
+            results = []
+            for chunk_results in pool.map(_process_chunk, chunks, [options] * len(chunks),
+                                          [as_route_result] * len(chunks)):
+                results.extend(chunk_results)
+            return results
+        finally:
+            if owned:
+                pool.shutdown()
@@ -0,0 +1,206 @@
+"""
+    flight_route_plotter result cache file
+"""
+import collections
+import pickle
+import sqlite3
+import threading
+import time
+
+from . flight_locator import get_flight_route_result, parse_timestamp
+
+__all__ = ["ALGORITHM_VERSION", "RouteCache"]
+
+# part of every cache key, to be bumped whenever a change alters computed results
+ALGORITHM_VERSION = 3
+
+
+class RouteCache(object):
+    """
+    * Cache of RouteResult objects with an in-memory LRU and an optional SQLite store
+    ***
+        :params max_entries: maximum number of results kept in memory, least recently used ones are evicted
+        :params max_age: seconds after which a result is expired, None to keep results until evicted
+        :params path: SQLite file of the persistent store, None for memory only
+        :params max_disk_entries: maximum number of results in the store, oldest ones are evicted
+        :params time_precision: departure and arrival times are rounded to this many seconds in the key
+        :params coordinate_precision: number of decimals of the endpoints in the key
+
+    Flights whose key is the same share one result: a flight departing within time_precision of a
+    cached one gets the times (and events) of the cached flight. The key also holds the keyword
+    options of the request and ALGORITHM_VERSION, so a store written by an older version is ignored.
+
+        cache = RouteCache(max_entries=50000, max_age=86400, path="routes.sqlite")
+        data = cache.get_flight_route_data(51.47, -0.4543, "20190207T20:20:00Z",
+                                           8.1111, 98.3065, "20190208T07:05:00Z")
+    """
+
+    def __init__(self, max_entries=10000, max_age=None, path=None, max_disk_entries=None, time_precision=60,
+                 coordinate_precision=4):
+        self.max_entries = max_entries
+        self.max_age = max_age
+        self.path = path
+        self.max_disk_entries = max_disk_entries
+        self.time_precision = time_precision
+        self.coordinate_precision = coordinate_precision
+        self._lock = threading.RLock()
+        # key -> (creation time, RouteResult), least recently used first
+        self._entries = collections.OrderedDict()
+        self._stats = dict.fromkeys(("hits", "disk_hits", "misses", "evictions", "expirations"), 0)
+        self._db = None
+        if path is not None:
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute("CREATE TABLE IF NOT EXISTS routes "
+                             "(key TEXT PRIMARY KEY, created REAL NOT NULL, value BLOB NOT NULL)")
+            self._db.execute("CREATE INDEX IF NOT EXISTS routes_created ON routes (created)")
+            self._db.commit()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+        return False
+
+    def close(self):
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+    def get_key(self, start_latitide, start_longitude, start_datetime, end_latitude, end_longitude, end_datetime,
+                **options):
+        """
+        * Method to get the cache key of a flight
+        ***
+            :params options: keyword arguments of get_flight_route_result
+        * return str
+
+        A geometry option only saves the route computation, so it is left out of the key.
+        """
+        coordinates = [round(float(value), self.coordinate_precision)
+                       for value in (start_latitide, start_longitude, end_latitude, end_longitude)]
+        times = [int(round(parse_timestamp(value) / float(self.time_precision)))
+                 for value in (start_datetime, end_datetime)]
+        return repr((ALGORITHM_VERSION, self.time_precision, coordinates, times, sorted(item for item in options.items() if item[0] != "geometry")))
+
+    def _is_expired(self, created):
+        return self.max_age is not None and time.time() - created > self.max_age
+
+    def get(self, key):
+        """
+        * Method to look a key up in memory, then in the store
+        * return cached RouteResult or None
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if not self._is_expired(entry[0]):
+                    self._entries.move_to_end(key)
+                    self._stats["hits"] += 1
+                    return entry[1]
+                del self._entries[key]
+                self._stats["expirations"] += 1
+            if self._db is not None:
+                row = self._db.execute("SELECT created, value FROM routes WHERE key = ?", (key,)).fetchone()
+                if row is not None:
+                    if not self._is_expired(row[0]):
+                        result = pickle.loads(row[1])
+                        self._remember(key, row[0], result)
+                        self._stats["disk_hits"] += 1
+                        return result
+                    self._db.execute("DELETE FROM routes WHERE key = ?", (key,))
+                    self._db.commit()
+                    self._stats["expirations"] += 1
+            self._stats["misses"] += 1
+            return None
+
+    def _remember(self, key, created, result):
+        self._entries[key] = (created, result)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self._stats["evictions"] += 1
+
+    def put(self, key, result):
+        """
+        * Method to add a result to the memory cache and the store
+        """
+        created = time.time()
+        with self._lock:
+            self._remember(key, created, result)
+            if self._db is not None:
+                self._db.execute("INSERT OR REPLACE INTO routes (key, created, value) VALUES (?, ?, ?)",
+                                 (key, created, pickle.dumps(result, pickle.HIGHEST_PROTOCOL)))
+                if self.max_disk_entries is not None:
+                    evicted = self._db.execute(
+                        "DELETE FROM routes WHERE key IN (SELECT key FROM routes ORDER BY created DESC "
+                        "LIMIT -1 OFFSET ?)", (self.max_disk_entries,)).rowcount
+                    self._stats["evictions"] += max(evicted, 0)
+                self._db.commit()
+
+    def purge(self):
+        """
+        * Method to remove the expired results from memory and from the store
+        * return number of removed results
+        """
+        if self.max_age is None:
+            return 0
+        limit = time.time() - self.max_age
+        with self._lock:
+            expired = [key for key, (created, _) in self._entries.items() if created < limit]
+            for key in expired:
+                del self._entries[key]
+            removed = len(expired)
+            if self._db is not None:
+                removed += max(self._db.execute("DELETE FROM routes WHERE created < ?", (limit,)).rowcount, 0)
+                self._db.commit()
+            self._stats["expirations"] += removed
+            return removed
+
+    def clear(self):
+        """
+        * Method to remove every result from memory and from the store
+        """
+        with self._lock:
+            self._entries.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM routes")
+                self._db.commit()
+
+    def get_stats(self):
+        """
+        * Method to get the cache statistics
+        * return dict with hits, disk_hits, misses, evictions, expirations and entries
+        """
+        with self._lock:
+            stats = dict(self._stats, entries=len(self._entries))
+            if self._db is not None:
+                stats["disk_entries"] = self._db.execute("SELECT COUNT(*) FROM routes").fetchone()[0]
+            return stats
+
+    def get_flight_route_result(self, start_latitide, start_longitude, start_datetime, end_latitude, end_longitude,
+                                end_datetime, **options):
+        """
+        * Method to get get_flight_route_result from the cache, computing and caching it on a miss
+        * return RouteResult, shared between the callers so it must not be modified
+        """
+        args = (start_latitide, start_longitude, start_datetime, end_latitude, end_longitude, end_datetime)
+        key = self.get_key(*args, **options)
+        result = self.get(key)
+        if result is None:
+            result = get_flight_route_result(*args, **options)
+            self.put(key, result)
+        return result
+
+    def get_flight_route_data(self, start_latitide, start_longitude, start_datetime, end_latitude, end_longitude,
+                              end_datetime, **options):
+        """
+        * Method to get get_flight_route_data from the cache, computing and caching it on a miss
+        * return formatted dict with flight's route information
+        """
+        return self.get_flight_route_result(start_latitide, start_longitude, start_datetime, end_latitude,
+                                            end_longitude, end_datetime, **options).to_dict()
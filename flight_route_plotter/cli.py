@@ -0,0 +1,259 @@
+"""
+    flight_route_plotter command line file
+
+    Reads flights from a CSV or JSONL file (or stdin) and writes one get_flight_route_data
+    result per line, in input order, as JSONL:
+
+        flight-route-plotter flights.csv -o results.jsonl --workers 8 --crossing-tolerance 1
+        cat flights.jsonl | flight-route-plotter --format jsonl > results.jsonl
+
+    A CSV needs a header row with the get_flight_route_data argument names (start_lat,
+    start_long, end_lat and end_long are accepted too), a JSONL line is either such an
+    object or a list of the six arguments in order. A row or line that cannot be read gives
+    an {"error": ...} line in its place, like a flight that fails.
+"""
+import argparse
+import collections
+import csv
+import itertools
+import json
+import os
+import sys
+import time
+
+from . batch import FLIGHT_FIELDS, _check_options, _get_executor, _process_chunk
+from . ephemeris import _using_ephemeris
+
+__all__ = ["main"]
+
+# columns converted to float when read from a CSV
+_NUMERIC_FIELDS = frozenset(name for names in FLIGHT_FIELDS for name in names if not name.endswith("datetime"))
+
+
+def _get_error_record(exc):
+    return {"error": "%s: %s" % (type(exc).__name__, exc)}
+
+
+def _is_error_record(record):
+    return isinstance(record, dict) and "error" in record
+
+
+def _iter_csv(stream):
+    # a row that cannot be read gives an error record in its place, the following rows are still read
+    reader = csv.DictReader(stream)
+    while True:
+        try:
+            row = next(reader)
+        except StopIteration:
+            return
+        except csv.Error as exc:
+            yield _get_error_record(exc)
+            continue
+        if not any(row.values()):
+            continue
+        try:
+            record = {name: float(value) if name in _NUMERIC_FIELDS and value else value
+                      for name, value in row.items()}
+        except ValueError as exc:
+            record = _get_error_record(exc)
+        yield record
+
+
+def _iter_jsonl(stream):
+    for line in stream:
+        line = line.strip()
+        if line:
+            try:
+                record = json.loads(line)
+            except ValueError as exc:
+                record = _get_error_record(exc)
+            yield record
+
+
+def _process_records(chunk, options):
+    """
+    * Method to process a chunk of records, passing on the error records of the readers in their place
+    """
+    results = iter(_process_chunk([record for record in chunk if not _is_error_record(record)], options))
+    return [record if _is_error_record(record) else next(results) for record in chunk]
+
+
+def _iter_chunks(records, chunk_size):
+    records = iter(records)
+    while True:
+        chunk = list(itertools.islice(records, chunk_size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _to_json(value):
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+    if hasattr(value, "tolist"):
+        return value.tolist()
+    raise TypeError("%r is not JSON serializable" % (value,))
+
+
+class _Progress(object):
+    """
+    * Periodic progress and throughput report on stderr
+    """
+
+    def __init__(self, interval, stream=sys.stderr):
+        self.interval = interval
+        self.stream = stream
+        self.start = self.last = time.perf_counter()
+        self.flights = 0
+        self.errors = 0
+
+    def update(self, results):
+        self.flights += len(results)
+        self.errors += sum(1 for result in results if "error" in result)
+        now = time.perf_counter()
+        if self.interval and now - self.last >= self.interval:
+            self.last = now
+            self.report()
+
+    def report(self, final=False):
+        if not self.interval:
+            return
+        elapsed = time.perf_counter() - self.start
+        self.stream.write("%s%d flights, %d errors, %.1fs, %.1f flights/s\n" % (
+            "done: " if final else "", self.flights, self.errors, elapsed, self.flights / elapsed if elapsed else 0.0))
+        self.stream.flush()
+
+
+def _get_parser():
+    parser = argparse.ArgumentParser(prog="flight-route-plotter", description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("input", nargs="?", default="-", help="CSV or JSONL file, - for stdin (default)")
+    parser.add_argument("-o", "--output", default="-", help="JSONL output file, - for stdout (default)")
+    parser.add_argument("--format", choices=("csv", "jsonl"),
+                        help="input format, guessed from the file extension, jsonl for stdin")
+    parser.add_argument("--executor", choices=("serial", "thread", "process"), default="process")
+    parser.add_argument("--workers", type=int, default=None, help="number of workers, defaults to the CPU count")
+    parser.add_argument("--chunk-size", type=int, default=500, help="flights sent to a worker at once")
+    parser.add_argument("--max-pending", type=int, default=None,
+                        help="chunks submitted but not yet written, defaults to twice the workers")
+    parser.add_argument("--crossing-tolerance", type=float, default=None,
+                        help="refine sunrise/sunset times to this many seconds")
+    parser.add_argument("--output-step-km", type=float, default=10,
+                        help="spacing of the returned enroute coordinates, 0 for none")
+    parser.add_argument("--max-points", type=int, default=None, help="maximum number of enroute coordinates")
+    parser.add_argument("--geometry-backend", choices=("ellipsoidal", "spherical"), default="ellipsoidal",
+                        help="WGS84 geodesic (default) or faster great circle routes")
+    parser.add_argument("--include-moon", action="store_true",
+                        help="add the moon's altitude and illumination to the night enroute coordinates")
+    parser.add_argument("--ephemeris", default=None, help="saved EphemerisTable used by the workers")
+    parser.add_argument("--progress-interval", type=float, default=10.0,
+                        help="seconds between progress reports on stderr, 0 to disable")
+    return parser
+
+
+def _open_input(path):
+    if path == "-":
+        return sys.stdin
+    return open(path, "r", encoding="utf-8", newline="")
+
+
+def _open_output(path):
+    if path == "-":
+        return sys.stdout
+    return open(path, "w", encoding="utf-8", newline="\n")
+
+
+def run(records, output, executor="process", workers=None, chunk_size=500, max_pending=None, options=None,
+        ephemeris=None, progress=None):
+    """
+    * Method to process flight records and write the results as JSONL in input order
+    ***
+        :params records: iterable of flight records, consumed lazily, {"error": ...} records of lines that
+                         could not be read are written as they are
+        :params output: text stream the JSON lines are written to
+        :params executor: "serial", "thread" or "process"
+        :params workers: number of workers, defaults to the number of CPUs
+        :params chunk_size: number of flights sent to a worker at once
+        :params max_pending: number of chunks submitted but not yet written, reading stops while it is reached
+        :params options: keyword arguments passed to get_flight_route_data except geometry
+        :params ephemeris: path of a saved EphemerisTable, used by the flights of this call only
+        :params progress: _Progress instance or None
+    * return number of flights written
+    """
+    options = options or {}
+    _check_options(options)
+    progress = progress or _Progress(0)
+    chunks = _iter_chunks(records, chunk_size)
+
+    def write(results):
+        for result in results:
+            output.write(json.dumps(result, default=_to_json))
+            output.write("\n")
+        progress.update(results)
+
+    # flights run in this process use the table for this call only, worker processes load it themselves
+    with _using_ephemeris(ephemeris if executor in ("serial", "thread") else None):
+        if executor == "serial":
+            for chunk in chunks:
+                write(_process_records(chunk, options))
+            return progress.flights
+
+        workers = workers or os.cpu_count() or 1
+        max_pending = max_pending or 2 * workers
+        pool, _ = _get_executor(executor, workers, ephemeris)
+        pending = collections.deque()
+        try:
+            for chunk in chunks:
+                # backpressure: wait for the oldest chunk before reading more input
+                if len(pending) >= max_pending:
+                    write(pending.popleft().result())
+                pending.append(pool.submit(_process_records, chunk, options))
+            while pending:
+                write(pending.popleft().result())
+        finally:
+            for future in pending:
+                future.cancel()
+            pool.shutdown()
+        return progress.flights
+
+
+def main(argv=None):
+    """
+    * Console script entry point
+    ***
+        :params argv: command line arguments, defaults to sys.argv[1:]
+    * return exit status
+    """
+    args = _get_parser().parse_args(argv)
+    input_format = args.format
+    if input_format is None:
+        input_format = "csv" if args.input.lower().endswith(".csv") else "jsonl"
+    options = {
+        "crossing_tolerance": args.crossing_tolerance,
+        "output_step_km": args.output_step_km or None,
+        "max_points": args.max_points,
+    }
+    if args.geometry_backend != "ellipsoidal":
+        options["geometry_backend"] = args.geometry_backend
+    if args.include_moon:
+        options["include_moon"] = True
+    progress = _Progress(args.progress_interval)
+
+    source = _open_input(args.input)
+    output = _open_output(args.output)
+    try:
+        records = _iter_csv(source) if input_format == "csv" else _iter_jsonl(source)
+        run(records, output, args.executor, args.workers, args.chunk_size, args.max_pending, options,
+            args.ephemeris, progress)
+    finally:
+        output.flush()
+        if args.output != "-":
+            output.close()
+        if args.input != "-":
+            source.close()
+    progress.report(final=True)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
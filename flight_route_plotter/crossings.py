@@ -0,0 +1,143 @@
+"""
+    flight_route_plotter terminator crossing file
+"""
+import math
+
+from . _lazy import lazy_import
+from . route_geometry import get_line_positions
+from . suncalc_v2 import getPositions
+
+np = lazy_import("numpy")
+
+__all__ = ["refine_crossing", "refine_crossings", "get_route_altitude_function"]
+
+
+def refine_crossing(fn, lo, hi, f_lo, f_hi, xtol, max_iterations=100):
+    """
+    * Method to refine a bracketed root with Brent's method
+    ***
+        :params fn: continuous scalar function
+        :params lo: start of the bracket
+        :params hi: end of the bracket
+        :params f_lo: fn(lo)
+        :params f_hi: fn(hi)
+        :params xtol: absolute tolerance on the root
+        :params max_iterations: maximum number of function evaluations
+    * return root of fn in [lo, hi] within xtol
+    """
+    if f_lo == 0:
+        return lo
+    if f_hi == 0:
+        return hi
+    if f_lo * f_hi > 0:
+        raise ValueError("root is not bracketed")
+
+    a, b, fa, fb = lo, hi, f_lo, f_hi
+    c, fc = a, fa
+    d = e = b - a
+    for _ in range(max_iterations):
+        if fb * fc > 0:
+            c, fc = a, fa
+            d = e = b - a
+        if abs(fc) < abs(fb):
+            a, b, c = b, c, b
+            fa, fb, fc = fb, fc, fb
+        tol = 2 * np.finfo(float).eps * abs(b) + 0.5 * xtol
+        m = 0.5 * (c - b)
+        if abs(m) <= tol or fb == 0:
+            return b
+        if abs(e) >= tol and abs(fa) > abs(fb):
+            # inverse quadratic interpolation, or secant when only two points are distinct
+            s = fb / fa
+            if a == c:
+                p = 2 * m * s
+                q = 1 - s
+            else:
+                q = fa / fc
+                r = fb / fc
+                p = s * (2 * m * q * (q - r) - (b - a) * (r - 1))
+                q = (q - 1) * (r - 1) * (s - 1)
+            if p > 0:
+                q = -q
+            p = abs(p)
+            if 2 * p < min(3 * m * q - abs(tol * q), abs(e * q)):
+                e, d = d, p / q
+            else:
+                d = e = m
+        else:
+            d = e = m
+        a, fa = b, fb
+        b += d if abs(d) > tol else math.copysign(tol, m)
+        fb = fn(b)
+    return b
+
+
+def refine_crossings(fn, lo, hi, f_lo, f_hi, xtol, max_iterations=100):
+    """
+    * Method to refine many bracketed roots at once with the Illinois variant of regula falsi
+    ***
+        :params fn: function(x, index) giving the values of the functions number index at x, both arrays
+        :params lo: array of bracket starts
+        :params hi: array of bracket ends
+        :params f_lo: values at lo
+        :params f_hi: values at hi, of the other sign
+        :params xtol: absolute tolerance on the roots
+        :params max_iterations: maximum number of calls of fn
+    * return array of roots within xtol
+
+    Every call of fn evaluates all the roots not converged yet, so refining hundreds of roots
+    costs about as many vectorized calls as refining one.
+    """
+    a = np.array(lo, dtype=float)
+    b = np.array(hi, dtype=float)
+    fa = np.array(f_lo, dtype=float)
+    fb = np.array(f_hi, dtype=float)
+    if np.any(fa * fb > 0):
+        raise ValueError("root is not bracketed")
+    roots = np.where(fa == 0, a, b)
+    # side of the bracket moved by the previous step, -1 for a and 1 for b
+    side = np.zeros(a.shape, dtype=np.int8)
+    active = np.flatnonzero((fa != 0) & (fb != 0) & (np.abs(b - a) > xtol))
+    for _ in range(max_iterations):
+        if not active.size:
+            break
+        a_, b_, fa_, fb_ = a[active], b[active], fa[active], fb[active]
+        c = (a_ * fb_ - b_ * fa_) / (fb_ - fa_)
+        fc = np.asarray(fn(c, active), dtype=float)
+        roots[active] = c
+
+        replace_b = fc * fb_ > 0
+        # Illinois: halve the value kept at the end that did not move twice in a row
+        fa_ = np.where(replace_b & (side[active] == 1), fa_ / 2, fa_)
+        fb_ = np.where(~replace_b & (side[active] == -1), fb_ / 2, fb_)
+        a[active] = np.where(replace_b, a_, c)
+        fa[active] = np.where(replace_b, fa_, fc)
+        b[active] = np.where(replace_b, c, b_)
+        fb[active] = np.where(replace_b, fc, fb_)
+        side[active] = np.where(replace_b, 1, -1)
+        active = active[(fc != 0) & (np.abs(b[active] - a[active]) > xtol)]
+    return roots
+
+
+def get_route_altitude_function(line, start_timestamp, total_duration):
+    """
+    * Method to get the sun's altitude along a route as a continuous function of distance
+    ***
+        :params line: GeodesicLine of the route
+        :params start_timestamp: departure time as epoch seconds
+        :params total_duration: flight duration in seconds
+    * return function mapping distance from the start in km to the sun's altitude (and azimuth), the positions
+             of the distances can be passed as positions=(latitudes, longitudes) when they are already known
+    """
+    route_length = line.s13 / 1000
+
+    def altitude_at(distance_km, with_azimuth=False, positions=None):
+        distance_km = np.asarray(distance_km, dtype=float)
+        lat, lon = get_line_positions(line, distance_km) if positions is None else positions
+        seconds = total_duration * distance_km / route_length if route_length else 0 * distance_km
+        sun_position = getPositions(start_timestamp + seconds, lat, lon)
+        if with_azimuth:
+            return sun_position, lat, lon, seconds
+        return sun_position["altitude"]
+
+    return altitude_at
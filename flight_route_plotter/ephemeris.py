@@ -0,0 +1,166 @@
+"""
+    flight_route_plotter solar ephemeris table file
+"""
+import calendar
+import struct
+from datetime import datetime
+
+from . import suncalc_v2
+from . _lazy import lazy_import
+
+np = lazy_import("numpy")
+
+__all__ = ["EphemerisTable", "use_ephemeris"]
+
+_MAGIC = b"FRPEPH01"
+# magic, number of nodes, first node (days since J2000), step (days), error bounds of dec/ra/gha (radians)
+_HEADER = struct.Struct("<8sQdd3d")
+_HEADER_SIZE = 64
+_COLUMNS = ("dec", "ra", "gha")
+
+
+class EphemerisTable(object):
+    """
+    * Precomputed sun declination, right ascension and Greenwich hour angle at a fixed time step
+    ***
+        d0 : first node, in days since J2000 (suncalc_v2.toDays)
+        step : time between two nodes in days
+        data : float64 array of shape (3, n) holding dec, ra and gha, the last two unwrapped
+        error_bound : dict of the maximum linear interpolation error in radians per column
+
+    Lookups interpolate linearly between nodes. The error of linear interpolation is at most
+    h^2 / 8 * max|f''|, which is estimated from the second differences of the nodes when the
+    table is built and stored with it. With the default one hour step it is below 1e-7 radians
+    (0.02 arc seconds) for every column, far below the accuracy of the suncalc model itself.
+    """
+
+    def __init__(self, d0, step, data, error_bound):
+        self.d0 = d0
+        self.step = step
+        self.data = data
+        self.error_bound = error_bound
+
+    def __len__(self):
+        return self.data.shape[1]
+
+    @property
+    def d1(self):
+        return self.d0 + (len(self) - 1) * self.step
+
+    @classmethod
+    def build(cls, start_year, end_year, step_hours=1.0):
+        """
+        * Method to compute the table for every year from start_year to end_year (both included)
+        ***
+            :params start_year: first year of the table
+            :params end_year: last year of the table
+            :params step_hours: time between two nodes in hours
+        * return EphemerisTable
+        """
+        start = calendar.timegm(datetime(start_year, 1, 1).timetuple())
+        end = calendar.timegm(datetime(end_year + 1, 1, 1).timetuple())
+        step = step_hours / 24.0
+        d0 = suncalc_v2.toDaysFromTimestamps(start)
+        n = int(np.ceil((suncalc_v2.toDaysFromTimestamps(end) - d0) / step)) + 1
+        d = d0 + np.arange(n) * step
+
+        c = suncalc_v2.sunCoordsArray(d)
+        ra = np.unwrap(c["ra"])
+        gha = suncalc_v2.rad * (280.16 + 360.9856235 * d) - ra
+        data = np.vstack([c["dec"], ra, gha])
+
+        second_differences = np.abs(np.diff(data, n=2, axis=1)).max(axis=1) if n > 2 else np.zeros(3)
+        error_bound = dict(zip(_COLUMNS, (second_differences / 8).tolist()))
+        return cls(float(d0), step, data, error_bound)
+
+    def save(self, path):
+        """
+        * Method to write the table into a compact binary file that load can memory-map
+        ***
+            :params path: file path
+        """
+        header = _HEADER.pack(_MAGIC, len(self), self.d0, self.step,
+                              *[self.error_bound[column] for column in _COLUMNS])
+        with open(path, "wb") as f:
+            f.write(header.ljust(_HEADER_SIZE, b"\0"))
+            f.write(np.ascontiguousarray(self.data, dtype="<f8").tobytes())
+
+    @classmethod
+    def load(cls, path, mmap=True):
+        """
+        * Method to read a table written by save
+        ***
+            :params path: file path
+            :params mmap: memory-map the file (shared between processes) instead of reading it
+        * return EphemerisTable
+        """
+        with open(path, "rb") as f:
+            magic, n, d0, step, dec_bound, ra_bound, gha_bound = _HEADER.unpack(f.read(_HEADER.size))
+            if magic != _MAGIC:
+                raise ValueError("%s is not an ephemeris table" % path)
+            if not mmap:
+                f.seek(_HEADER_SIZE)
+                data = np.fromfile(f, dtype="<f8", count=3 * n).reshape(3, n)
+        if mmap:
+            data = np.memmap(path, dtype="<f8", mode="r", offset=_HEADER_SIZE, shape=(3, n))
+        return cls(d0, step, data, dict(zip(_COLUMNS, (dec_bound, ra_bound, gha_bound))))
+
+    def covers(self, d):
+        """
+        * Method to check whether days since J2000 are all inside the table
+        """
+        d = np.asarray(d)
+        return d.size == 0 or (d.min() >= self.d0 and d.max() <= self.d1)
+
+    def lookup(self, d):
+        """
+        * Method to interpolate the table
+        ***
+            :params d: days since J2000, inside the table
+        * return dict with dec, ra and gha arrays in radians
+        """
+        position = (np.asarray(d, dtype=float) - self.d0) / self.step
+        index = np.clip(np.floor(position).astype(np.intp), 0, len(self) - 2)
+        fraction = position - index
+        lower = self.data[:, index]
+        upper = self.data[:, index + 1]
+        values = lower + (upper - lower) * fraction
+        return dict(zip(_COLUMNS, values))
+
+
+def use_ephemeris(table):
+    """
+    * Method to make suncalc_v2.getPositions use an ephemeris table when it covers the requested times
+    ***
+        :params table: EphemerisTable, path of a saved table (memory-mapped) or None to stop using one
+    * return the table in use
+    """
+    if table is not None and not isinstance(table, EphemerisTable):
+        table = EphemerisTable.load(table)
+    suncalc_v2.setEphemeris(table)
+    return table
+
+
+class _using_ephemeris(object):
+    """
+    * Context manager making getPositions use an ephemeris table inside a block only
+    ***
+        :params table: EphemerisTable, path of a saved table or None to leave the table in use as it is
+
+    The table is process-wide while the block runs (threads included) and the one in use before
+    is put back when it ends.
+    """
+
+    def __init__(self, table):
+        self.table = table
+        self.previous = None
+
+    def __enter__(self):
+        self.previous = suncalc_v2._ephemeris
+        if self.table is not None:
+            use_ephemeris(self.table)
+        return self
+
+    def __exit__(self, *exc_info):
+        suncalc_v2.setEphemeris(self.previous)
+        return False
@@ -0,0 +1,294 @@
+"""
+    flight_route_plotter columnar export file
+
+    Writes RouteResult objects as three tables keyed by flight_id:
+
+        flights   one row per flight: flight_id, start_day, end_day, travel_distance, total_duration,
+                  speed, night_seconds (unrounded), sample_offset and sample_count (rows of the flight in
+                  samples)
+        samples   one row per enroute point: flight_id, lat, lon, sun_altitude (radians), epoch_ms
+        events    one row per sunrise/sunset: flight_id, sunrise (False for a sunset), lat, lon, timestamp
+
+    The "npy" format is a directory per table with one .npy file per column, appended in place
+    and opened with numpy memory mapping; "arrow" (IPC file) and "parquet" need pyarrow.
+"""
+import os
+import struct
+
+from . _lazy import lazy_import
+
+np = lazy_import("numpy")
+
+__all__ = ["EXPORT_FORMATS", "TABLE_COLUMNS", "ColumnarWriter", "write_route_results", "read_columnar"]
+
+EXPORT_FORMATS = ("npy", "arrow", "parquet")
+
+# columns and numpy dtype of every table
+TABLE_COLUMNS = {
+    "flights": (("flight_id", "int64"), ("start_day", "bool"), ("end_day", "bool"), ("travel_distance", "float64"),
+                ("total_duration", "int32"), ("speed", "float64"), ("night_seconds", "float64"),
+                ("sample_offset", "int64"), ("sample_count", "int32")),
+    "samples": (("flight_id", "int64"), ("lat", "float64"), ("lon", "float64"), ("sun_altitude", "float64"),
+                ("epoch_ms", "int64")),
+    "events": (("flight_id", "int64"), ("sunrise", "bool"), ("lat", "float64"), ("lon", "float64"),
+               ("timestamp", "float64")),
+}
+
+# size of the .npy headers written here, large enough for any length so they can be rewritten in place
+_NPY_HEADER_SIZE = 128
+
+
+class _NpyColumn(object):
+    """
+    * Appendable .npy file of a one dimensional array
+    ***
+        :params path: file path
+        :params dtype: numpy dtype of the column
+        :params append: keep the rows of an existing file written by _NpyColumn
+    """
+
+    def __init__(self, path, dtype, append=False):
+        self.dtype = np.dtype(dtype)
+        self.length = 0
+        if append and os.path.exists(path):
+            self.file = open(path, "r+b")
+            np.lib.format.read_magic(self.file)
+            shape, _, dtype = np.lib.format.read_array_header_1_0(self.file)
+            if self.file.tell() != _NPY_HEADER_SIZE or dtype != self.dtype:
+                self.file.close()
+                raise ValueError("%s was not written by ColumnarWriter or has another dtype" % path)
+            self.length = shape[0]
+            self.file.seek(_NPY_HEADER_SIZE + self.length * self.dtype.itemsize)
+            self.file.truncate()
+        else:
+            self.file = open(path, "w+b")
+            self._write_header()
+
+    def _write_header(self):
+        header = "{'descr': %r, 'fortran_order': False, 'shape': (%d,), }" % (
+            np.lib.format.dtype_to_descr(self.dtype), self.length)
+        header = header.ljust(_NPY_HEADER_SIZE - 11) + "\n"
+        self.file.seek(0)
+        self.file.write(np.lib.format.magic(1, 0) + struct.pack("<H", len(header)) + header.encode("latin1"))
+
+    def append(self, values):
+        self.file.seek(0, os.SEEK_END)
+        self.file.write(np.ascontiguousarray(values, dtype=self.dtype).tobytes())
+        self.length += len(values)
+
+    def flush(self):
+        # the header only counts rows already on disk, so a file cut short by a crash stays readable
+        self.file.flush()
+        self._write_header()
+        self.file.flush()
+
+    def close(self):
+        self.flush()
+        self.file.close()
+
+
+class _NpyTable(object):
+    def __init__(self, path, columns, append=False):
+        if not os.path.isdir(path):
+            os.makedirs(path)
+        self.columns = [(name, _NpyColumn(os.path.join(path, name + ".npy"), dtype, append))
+                        for name, dtype in columns]
+        if len(set(column.length for _, column in self.columns)) > 1:
+            self.close()
+            raise ValueError("columns of %s have different lengths" % path)
+        self.length = self.columns[0][1].length
+
+    def append(self, data):
+        for name, column in self.columns:
+            column.append(data[name])
+        self.length += len(data[self.columns[0][0]])
+        for _, column in self.columns:
+            column.flush()
+
+    def close(self):
+        for _, column in self.columns:
+            column.close()
+
+
+class _ArrowTable(object):
+    def __init__(self, path, columns, file_format):
+        try:
+            import pyarrow
+            import pyarrow.ipc
+            import pyarrow.parquet
+        except ImportError:
+            raise ImportError("the %s format needs pyarrow (pip install flight-route-plotter[arrow])" % file_format)
+        self.pa = pyarrow
+        self.columns = columns
+        self.schema = pyarrow.schema([(name, pyarrow.from_numpy_dtype(np.dtype(dtype))) for name, dtype in columns])
+        self.length = 0
+        if file_format == "parquet":
+            self.writer = pyarrow.parquet.ParquetWriter(path + ".parquet", self.schema)
+        else:
+            self.writer = pyarrow.ipc.new_file(path + ".arrow", self.schema)
+
+    def append(self, data):
+        # one record batch (parquet row group) per chunk
+        table = self.pa.Table.from_arrays([self.pa.array(np.asarray(data[name], dtype=dtype))
+                                           for name, dtype in self.columns], schema=self.schema)
+        self.writer.write_table(table)
+        self.length += table.num_rows
+
+    def close(self):
+        self.writer.close()
+
+
+class ColumnarWriter(object):
+    """
+    * Chunked writer of RouteResult objects into flights, samples and events tables
+    ***
+        :params path: output directory
+        :params file_format: "npy", "arrow" or "parquet", see EXPORT_FORMATS
+        :params chunk_size: number of flights buffered before they are written out
+        :params append: add to the tables already in path (npy only), flight ids going on from the last one
+
+    Rows are buffered as arrays and written one chunk at a time, so the memory used does not
+    depend on the number of flights, and nothing is converted to Python objects on the way.
+
+        with ColumnarWriter("routes") as writer:
+            writer.write_many(get_flight_route_data_many(flights, as_route_result=True))
+        tables = read_columnar("routes")
+        tables["samples"]["lat"]  # numpy memmap
+    """
+
+    def __init__(self, path, file_format="npy", chunk_size=1000, append=False):
+        if file_format not in EXPORT_FORMATS:
+            raise ValueError("unknown file_format %r, expected one of %s" % (file_format, ", ".join(EXPORT_FORMATS)))
+        if append and file_format != "npy":
+            raise ValueError("only the npy format can be appended to")
+        if not os.path.isdir(path):
+            os.makedirs(path)
+        self.path = path
+        self.file_format = file_format
+        self.chunk_size = chunk_size
+        self._tables = {}
+        for table, columns in TABLE_COLUMNS.items():
+            if file_format == "npy":
+                self._tables[table] = _NpyTable(os.path.join(path, table), columns, append)
+            else:
+                self._tables[table] = _ArrowTable(os.path.join(path, table), columns, file_format)
+        self.next_flight_id = 0
+        flights = self._tables["flights"]
+        if flights.length:
+            self.next_flight_id = int(np.load(os.path.join(path, "flights", "flight_id.npy"), mmap_mode="r")[-1]) + 1
+        self._sample_rows = self._tables["samples"].length
+        self._buffer = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+        return False
+
+    def write(self, result, flight_id=None):
+        """
+        * Method to add a flight
+        ***
+            :params result: RouteResult, a dict (e.g. a failed flight's {"error": ...}) is skipped
+            :params flight_id: id of the flight, the next one after the last written by default
+        * return flight id given to the flight
+        """
+        if flight_id is None:
+            flight_id = self.next_flight_id
+        self.next_flight_id = flight_id + 1
+        if not isinstance(result, dict):
+            self._buffer.append((flight_id, result))
+            if len(self._buffer) >= self.chunk_size:
+                self.flush()
+        return flight_id
+
+    def write_many(self, results):
+        """
+        * Method to add flights, a failed flight's dict leaving a gap in the flight ids
+        ***
+            :params results: iterable of RouteResult, e.g. get_flight_route_data_many(..., as_route_result=True)
+        """
+        for result in results:
+            self.write(result)
+
+    def flush(self):
+        """
+        * Method to write the buffered flights out
+        """
+        if not self._buffer:
+            return
+        flight_ids = np.array([flight_id for flight_id, _ in self._buffer], dtype=np.int64)
+        results = [result for _, result in self._buffer]
+        self._buffer = []
+
+        counts = np.array([len(result) for result in results], dtype=np.int64)
+        offsets = self._sample_rows + np.concatenate([[0], np.cumsum(counts)[:-1]])
+        self._sample_rows += int(counts.sum())
+        self._tables["flights"].append({
+            "flight_id": flight_ids,
+            "start_day": [result.start == "day" for result in results],
+            "end_day": [result.end == "day" for result in results],
+            "travel_distance": [result.travel_distance for result in results],
+            "total_duration": [result.total_duration for result in results],
+            "speed": [result.speed for result in results],
+            "night_seconds": [result.night_seconds for result in results],
+            "sample_offset": offsets,
+            "sample_count": counts,
+        })
+        self._tables["samples"].append({
+            "flight_id": np.repeat(flight_ids, counts),
+            "lat": np.concatenate([result.latitudes for result in results]),
+            "lon": np.concatenate([result.longitudes for result in results]),
+            "sun_altitude": np.concatenate([result.altitudes for result in results]),
+            "epoch_ms": np.concatenate([result.epoch_ms for result in results]),
+        })
+        events = [(flight_id, event) for flight_id, result in zip(flight_ids.tolist(), results)
+                  for event in result.events]
+        self._tables["events"].append({
+            "flight_id": np.array([flight_id for flight_id, _ in events], dtype=np.int64),
+            "sunrise": np.array([event.kind == "sunrise" for _, event in events], dtype=bool),
+            "lat": np.array([event.lat for _, event in events], dtype=np.float64),
+            "lon": np.array([event.lon for _, event in events], dtype=np.float64),
+            "timestamp": np.array([event.timestamp for _, event in events], dtype=np.float64),
+        })
+
+    def close(self):
+        """
+        * Method to write the buffered flights out and close the tables
+        """
+        if self._tables:
+            try:
+                self.flush()
+            finally:
+                for table in self._tables.values():
+                    table.close()
+                self._tables = {}
+
+
+def write_route_results(path, results, file_format="npy", chunk_size=1000, append=False):
+    """
+    * Method to export route results into columnar tables
+    ***
+        :params path: output directory
+        :params results: iterable of RouteResult, consumed lazily
+        :params file_format, chunk_size, append: see ColumnarWriter
+    * return number of flight ids used
+    """
+    with ColumnarWriter(path, file_format, chunk_size, append) as writer:
+        first = writer.next_flight_id
+        writer.write_many(results)
+        return writer.next_flight_id - first
+
+
+def read_columnar(path, mmap=True):
+    """
+    * Method to open the tables written by ColumnarWriter in the npy format
+    ***
+        :params path: directory given to ColumnarWriter
+        :params mmap: memory-map the columns instead of reading them
+    * return dict of table name to dict of column name to array
+    """
+    return {table: {name: np.load(os.path.join(path, table, name + ".npy"), mmap_mode="r" if mmap else None)
+                    for name, _ in columns}
+            for table, columns in TABLE_COLUMNS.items()}
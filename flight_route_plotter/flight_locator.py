@@ -1,14 +1,29 @@
 """
     flight_route_plotter controller file
 """
+import calendar
 import math
 import time
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 
-import pytz
-from . suncalc_v2 import getPosition
-from geographiclib.geodesic import Geodesic
-from geopy.distance import lonlat, great_circle
+from . _lazy import lazy_import
+from . suncalc_v2 import getMoonIlluminations, getMoonPositions, getPosition, getPositions
+from . crossings import get_route_altitude_function, refine_crossing
+from . route_geometry import RouteGeometry, get_line_positions, get_route_line
+# moved to route_geometry, still importable from here
+from . route_geometry import EARTH_RADIUS, get_great_circle_distance  # noqa: F401
+from . route_result import RouteResult, SunEvent
+from . terminator import get_terminator_crossings
+from . profiling import timed_stage
+
+np = lazy_import("numpy")
+_kernels = lazy_import("flight_route_plotter.kernels")
+_geodesic = lazy_import("geographiclib.geodesic")
+
+DATETIME_FORMAT = "%Y%m%dT%H:%M:%SZ"
+
+# spacing of the coarse solar samples used to bracket sunrise/sunset when a crossing tolerance is given
+CROSSING_SEARCH_STEP_KM = 250
 
 
 def get_bearing(start_point, end_point):
@@ -58,7 +73,7 @@ def get_positional_data(A, B, speed, start_datetime_obj):
         sun_position : sun's positio on next coordinate
         time_at_c : time at C
     """
-    geod = Geodesic.WGS84
+    geod = _geodesic.Geodesic.WGS84
     # azimuth between start and end points
     inv = geod.Inverse(A[0], A[1], B[0], B[1])
 
@@ -74,7 +89,7 @@ def get_positional_data(A, B, speed, start_datetime_obj):
     c_reaching_time = s_in_km / speed
 
     # Time when flight reaches C
-    time_at_c = start_datetime_obj.astimezone(pytz.timezone("UTC")) + timedelta(hours=c_reaching_time)
+    time_at_c = start_datetime_obj.astimezone(timezone.utc) + timedelta(hours=c_reaching_time)
 
     # sun's position at C
     sun_position = getPosition(time_at_c, A[0], A[1])
@@ -103,60 +118,139 @@ def get_roundoff_time(total_seconds):
     return roundoff_time
 
 
-def calculate_night_hours(sunset_coordinates_list, sunrise_coordinates_list, travel_info,
-                          start_datetime_obj, end_datetime_obj):
+def _format_duration(seconds):
     """
-    * Method to calculate night duration
+    * Method to format a duration as HH:MM:SS, hours going past 24 (get_roundoff_time wraps at a day)
+    """
+    seconds = int(round(seconds))
+    return "%02d:%02d:%02d" % (seconds // 3600, seconds % 3600 // 60, seconds % 60)
+
+
+def _timedelta_seconds(seconds):
+    """
+    * Method giving the seconds attribute of a timedelta of the given length (the part below one day)
+    """
+    return int(math.floor(seconds)) % 86400
+
+
+def _to_timestamp(datetime_obj):
+    """
+    * Method to convert a datetime into epoch seconds, naive datetimes being taken as UTC
+    """
+    if datetime_obj.tzinfo is None:
+        return calendar.timegm(datetime_obj.timetuple()) + datetime_obj.microsecond / 1e6
+    return datetime_obj.timestamp()
+
+
+def parse_timestamp(datetime_string):
+    """
+    * Method to convert a flight datetime string ("%Y%m%dT%H:%M:%SZ", UTC) into epoch seconds
     ***
-        :param: sunset_coordinates_list - list of enroute sunset coordinates
-        :param: sunrise_coordinates_list - list of enroute sunrise coordinates
-        :param: travel_info - list of enroute sunset coordinates with sun's position
-        :param: start_datetime_obj - start_datetime_obj
-        :param: end_datetime_obj - end_datetime_obj
-    * return total night duration
+        :params datetime_string: datetime string
+
+    * return epoch seconds, independent of the host's timezone
+    """
+    return calendar.timegm(time.strptime(datetime_string, DATETIME_FORMAT))
+
+
+@timed_stage("night_hours")
+def calculate_night_seconds(sunset_times, sunrise_times, travel_info, start_timestamp, end_timestamp):
+    """
+    * Method to calculate night duration from epoch seconds
+    ***
+        :param: sunset_times - epoch seconds of the enroute sunsets
+        :param: sunrise_times - epoch seconds of the enroute sunrises
+        :param: travel_info - dict with start, end and total_duration (in seconds)
+        :param: start_timestamp - departure epoch seconds
+        :param: end_timestamp - arrival epoch seconds
+    * return total night duration in seconds
     """
-    same_day = True if (end_datetime_obj - start_datetime_obj).days == 0 else False
+    same_day = math.floor((end_timestamp - start_timestamp) / 86400) == 0
     night_seconds, day_seconds = 0.0, 0.0
 
     if travel_info["start"] == "day" and travel_info["end"] == "day" and same_day:
-        if sunset_coordinates_list and sunset_coordinates_list:
-            night_seconds = (sunrise_coordinates_list[0]["datetime_of_sunrise"] - sunset_coordinates_list[0
-            ]["datetime_of_sunset"]).seconds
+        if sunset_times and sunset_times:
+            night_seconds = _timedelta_seconds(sunrise_times[0] - sunset_times[0])
     elif travel_info["start"] == "day" and travel_info["end"] == "day" and not same_day:
-        if len(sunrise_coordinates_list) == 1 and len(sunset_coordinates_list) == 1:
-            time_diff = (sunrise_coordinates_list[0]["datetime_of_sunrise"] - sunset_coordinates_list[0]["datetime_of_sunset"]).seconds
-            night_seconds = (end_datetime_obj - sunset_coordinates_list[0]["datetime_of_sunset"]).seconds if time_diff > 0 else 0
-        elif len(sunrise_coordinates_list) > 1 or len(sunset_coordinates_list) > 1:
-            night_seconds = ((sunrise_coordinates_list[0]["datetime_of_sunrise"
-                              ] - sunset_coordinates_list[0]["datetime_of_sunset"]) + (
-                    end_datetime_obj - sunset_coordinates_list[1]["datetime_of_sunset"])).seconds
+        if len(sunrise_times) == 1 and len(sunset_times) == 1:
+            time_diff = _timedelta_seconds(sunrise_times[0] - sunset_times[0])
+            night_seconds = _timedelta_seconds(end_timestamp - sunset_times[0]) if time_diff > 0 else 0
+        elif len(sunrise_times) > 1 or len(sunset_times) > 1:
+            night_seconds = _timedelta_seconds((sunrise_times[0] - sunset_times[0]) +
+                                               (end_timestamp - sunset_times[1]))
     elif travel_info["start"] == "night" and travel_info["end"] == "night":
-        if sunset_coordinates_list and sunrise_coordinates_list:
-            day_seconds = (sunset_coordinates_list[0]["datetime_of_sunset"
-                           ] - sunrise_coordinates_list[0]["datetime_of_sunrise"]).seconds
+        if sunset_times and sunrise_times:
+            day_seconds = _timedelta_seconds(sunset_times[0] - sunrise_times[0])
             night_seconds = travel_info["total_duration"] - day_seconds
         else:
-            night_seconds = (end_datetime_obj - start_datetime_obj).seconds
+            night_seconds = _timedelta_seconds(end_timestamp - start_timestamp)
 
     elif travel_info["start"] == "day" and travel_info["end"] == "night":
-        if sunrise_coordinates_list and len(sunset_coordinates_list) > 1:
-            night_seconds = ((sunrise_coordinates_list[0]["datetime_of_sunrise"] - sunset_coordinates_list[0][
-                "datetime_of_sunset"]) + (end_datetime_obj- sunset_coordinates_list[1]["datetime_of_sunset"])).seconds
+        if sunrise_times and len(sunset_times) > 1:
+            night_seconds = _timedelta_seconds((sunrise_times[0] - sunset_times[0]) +
+                                               (end_timestamp - sunset_times[1]))
         else:
-            night_seconds = (end_datetime_obj - sunset_coordinates_list[0]["datetime_of_sunset"]).seconds
+            night_seconds = _timedelta_seconds(end_timestamp - sunset_times[0])
     elif travel_info["start"] == "night" and travel_info["end"] == "day":
-        if len(sunrise_coordinates_list) > 1 and sunset_coordinates_list:
-            night_seconds = ((sunrise_coordinates_list[0]["datetime_of_sunrise"] - start_datetime_obj) + (
-                    sunrise_coordinates_list[1]["datetime_of_sunrise"] - sunset_coordinates_list[0
-            ]["datetime_of_sunset"])).seconds
+        if len(sunrise_times) > 1 and sunset_times:
+            night_seconds = _timedelta_seconds((sunrise_times[0] - start_timestamp) +
+                                               (sunrise_times[1] - sunset_times[0]))
         else:
-            day_seconds = (end_datetime_obj - sunrise_coordinates_list[0]["datetime_of_sunrise"]).seconds
+            day_seconds = _timedelta_seconds(end_timestamp - sunrise_times[0])
             night_seconds = travel_info["total_duration"] - day_seconds
 
+    return night_seconds
+
+
+def _get_night_seconds(start, events, start_timestamp, end_timestamp):
+    """
+    * Method to add up the night time of a flight from its state at departure and its SunEvents
+    * return night time in seconds, neither rounded nor wrapped at a day
+    """
+    night = start == "night"
+    night_seconds, since = 0.0, start_timestamp
+    for event in events:
+        if night:
+            night_seconds += event.timestamp - since
+        night, since = event.kind == "sunset", event.timestamp
+    if night:
+        night_seconds += end_timestamp - since
+    return night_seconds
+
+
+def calculate_night_hours(sunset_coordinates_list, sunrise_coordinates_list, travel_info,
+                          start_datetime_obj, end_datetime_obj):
+    """
+    * Method to calculate night duration
+    ***
+        :param: sunset_coordinates_list - list of enroute sunset coordinates
+        :param: sunrise_coordinates_list - list of enroute sunrise coordinates
+        :param: travel_info - list of enroute sunset coordinates with sun's position
+        :param: start_datetime_obj - start_datetime_obj
+        :param: end_datetime_obj - end_datetime_obj
+    * return total night duration
+    """
+    sunset_times = [_to_timestamp(point["datetime_of_sunset"]) for point in sunset_coordinates_list]
+    sunrise_times = [_to_timestamp(point["datetime_of_sunrise"]) for point in sunrise_coordinates_list]
+    night_seconds = calculate_night_seconds(sunset_times, sunrise_times, travel_info,
+                                            _to_timestamp(start_datetime_obj), _to_timestamp(end_datetime_obj))
     night_duration = get_roundoff_time(night_seconds)
     return night_duration
 
 
+@timed_stage("classification", lambda args, result: len(args[0]))
+def get_sun_transitions(altitudes, state):
+    """
+    * Method to find the points at which the flight passes from day to night or night to day
+    ***
+        :params altitudes: sun's altitude at every enroute point
+        :params state: "day" or "night" at departure
+    * return list of (index, "sunset"/"sunrise") tuples
+    """
+    indices, directions = _kernels.sun_transitions(altitudes, state)
+    return [(int(index), "sunrise" if direction > 0 else "sunset") for index, direction in zip(indices, directions)]
+
+
 def process_positional_data(travel_info, start_datetime_obj, end_datetime_obj):
     """
     * Method to process coordinate wise data to find sunrise and sunset coordinates
@@ -168,30 +262,20 @@ def process_positional_data(travel_info, start_datetime_obj, end_datetime_obj):
     """
     sunset_coordinates_list = []
     sunrise_coordinates_list = []
-    state = travel_info["start"]
     coordinates = travel_info["coordinates_list"]
-    for point in coordinates:
-        if state == "day" and point:
-            if point["altitude"] < 0:
-                state = "night"
-                point["datetime_of_sunset"] = point["time_at_c"]
-                point["sunrise_on_route"] = False
-                point["sunset_on_route"] = True
-                del point["azimuth"]
-                del point["index"]
-                del point["time_at_c"]
-                sunset_coordinates_list.append(point)
-        if state == "night":
-            if point["altitude"] > 0:
-                state = "day"
-                point["datetime_of_sunrise"] = point["time_at_c"]
-                point["sunrise_on_route"] = True
-                point["sunset_on_route"] = False
-                del point["azimuth"]
-                del point["index"]
-                del point["time_at_c"]
-                sunrise_coordinates_list.append(point)
-        del point["altitude"]
+    transitions = get_sun_transitions([point["altitude"] for point in coordinates], travel_info["start"])
+    for index, kind in transitions:
+        event = coordinates[index]
+        event["datetime_of_" + kind] = event.pop("time_at_c")
+        event["sunrise_on_route"] = kind == "sunrise"
+        event["sunset_on_route"] = kind == "sunset"
+        del event["azimuth"]
+        del event["index"]
+        event.pop("altitude", None)
+        if kind == "sunset":
+            sunset_coordinates_list.append(event)
+        else:
+            sunrise_coordinates_list.append(event)
 
     travel_info["point_sunset_info"] = sunset_coordinates_list
     travel_info["point_sunrise_info"] = sunrise_coordinates_list
@@ -202,9 +286,33 @@ def process_positional_data(travel_info, start_datetime_obj, end_datetime_obj):
     return travel_info
 
 
-def get_flight_route_data(start_latitide, start_longitude, start_datetime, end_latitude, end_longitude, end_datetime):
+def _refine_event(altitude_at, lo, hi, f_hi, xtol, threshold=0.0):
     """
-    * Method to find sun's position during flight
+    * Method to locate a sunrise/sunset between two distances along the route
+    ***
+        :params altitude_at: route altitude function from get_route_altitude_function
+        :params lo: distance in km of the point before the crossing
+        :params hi: distance in km of the point after the crossing
+        :params f_hi: sun's altitude at hi minus threshold
+        :params xtol: tolerance on the distance in km
+        :params threshold: sun's altitude in radians separating day from night
+    * return lat, long and seconds after departure of the crossing, or None when it is not bracketed
+    """
+    f_lo = float(altitude_at(lo)) - threshold
+    if f_lo * f_hi > 0:
+        return None
+    crossing = refine_crossing(lambda x: float(altitude_at(x)) - threshold, lo, hi, f_lo, f_hi, xtol)
+    _, lat, lon, seconds = altitude_at(crossing, with_azimuth=True)
+    return float(lat), float(lon), float(seconds)
+
+
+@timed_stage("route", lambda args, result: len(result))
+def get_flight_route_result(start_latitide, start_longitude, start_datetime, end_latitude, end_longitude,
+                            end_datetime, crossing_tolerance=None, sampling_step_km=None, output_step_km=10,
+                            max_points=None, geometry=None, crossing_method="samples", horizon_altitude=0,
+                            include_moon=False, geometry_backend="ellipsoidal"):
+    """
+    * Method to find sun's position during flight as an array backed RouteResult
     ***
         :params start_latitide : source's latitude
         :params start_longitude : source's longitude
@@ -212,72 +320,207 @@ def get_flight_route_data(start_latitide, start_longitude, start_datetime, end_l
         :params end_latitude : destination's latitude
         :params end_longitude : destination's latitude
         :params end_datetime : flight's arrival latitude
-
-    * return formatted dict with flight's route information
+        :params crossing_tolerance : precision of sunrise/sunset times in seconds, when given each crossing is
+                                     refined with a root solver instead of being snapped to the sampling grid
+        :params sampling_step_km : spacing of the sun samples used to find sunrise/sunset, defaults to 10km,
+                                   or CROSSING_SEARCH_STEP_KM when crossing_tolerance is given
+        :params output_step_km : spacing of the returned enroute coordinates, None for none
+        :params max_points : maximum number of returned enroute coordinates
+        :params geometry : RouteGeometry of the route (e.g. from a RouteGeometryPool) to reuse across departures
+        :params crossing_method : "samples" finds sunrise/sunset from the sun samples, "terminator" solves for
+                                  them directly (see terminator.py) to crossing_tolerance, 1 second by default
+        :params horizon_altitude : sun's altitude in degrees separating day from night, 0 by default,
+                                   terminator.SUNRISE_ALTITUDE (-0.833) for the apparent sunrise/sunset
+        :params include_moon : when True, also give the moon's altitude and illuminated fraction at the enroute
+                               points where the sun is below horizon_altitude
+        :params geometry_backend : "ellipsoidal" (WGS84 geodesic) or "spherical" (great circle, faster), see
+                                   route_geometry.GEOMETRY_BACKENDS, unused when geometry is given
+
+    * return RouteResult, RouteResult.to_dict() gives the get_flight_route_data format
     """
-    day = False
-    night = False
-    coordinates_list = []
-
-    # start point day/night finder
-    start_datetime_obj = datetime.strptime(start_datetime, "%Y%m%dT%H:%M:%SZ")
-    end_datetime_obj = datetime.strptime(end_datetime, "%Y%m%dT%H:%M:%SZ")
-    tz_start_time = start_datetime_obj.astimezone(pytz.timezone("UTC"))
-    tz_end_time = end_datetime_obj.astimezone(pytz.timezone("UTC"))
-
-    # checking for sun's position at start point to get if flight started in day or night
-    initial_sun_position = getPosition(tz_start_time, start_latitide, start_longitude)
-    if initial_sun_position["altitude"] > 0:
-        day = True
-
-    # checking for sun's position at start point to get if flight ended in day or night
-    final_sun_position = getPosition(tz_end_time, end_latitude, end_longitude)
-    if final_sun_position["altitude"] > 0:
-        night = True
-
-    # distance between start and end point
-    travel_distance = great_circle(lonlat(start_longitude, start_latitide),
-                                   lonlat(end_longitude, end_latitude)).kilometers
-
-    total_duration = (end_datetime_obj - start_datetime_obj).seconds
+    # time is carried as UTC epoch seconds, datetimes are only built by RouteResult.to_dict
+    start_timestamp = parse_timestamp(start_datetime)
+    end_timestamp = parse_timestamp(end_datetime)
 
-    speed = travel_distance/(total_duration/3600)
-    travel_info = {
-        "start": "day" if day else "night",
-        "end": "day" if night else "night",
-        "travel_distance": travel_distance,
-        "total_duration": time.strftime('%H:%M:%S', time.gmtime((end_datetime_obj - start_datetime_obj).seconds)),
-        "speed": speed/1.852
-    }
+    # checking for sun's position at start and end points to get if flight started/ended in day or night
+    terminal_sun_positions = getPositions([start_timestamp, end_timestamp], [start_latitide, end_latitude],
+                                          [start_longitude, end_longitude])
+    threshold = math.radians(horizon_altitude)
+    start = "day" if terminal_sun_positions["altitude"][0] > threshold else "night"
+    end = "day" if terminal_sun_positions["altitude"][1] > threshold else "night"
 
     A = (start_latitide, start_longitude)  # Point A (lat, long)
     B = (end_latitude, end_longitude)  # Point B (lat, lon)
+    if geometry is None:
+        geometry = RouteGeometry(A, B, geometry_backend)
+
+    # distance between start and end point
+    travel_distance = geometry.travel_distance
+
+    total_duration = _timedelta_seconds(end_timestamp - start_timestamp)
     speed = travel_distance/(total_duration/3600)
 
-    # code for finding geopoints after every 10km
-    points_inbetween_coordinates = math.floor(travel_distance / 10)
-
-    enroute_coordinates = []
-
-    for point in range(points_inbetween_coordinates+1):
-
-        positional_data, time_at_c, coordinates = get_positional_data(A, B, speed, start_datetime_obj)
-        A = coordinates
-        start_datetime_obj = time_at_c
-        positional_data["index"] = point
-        positional_data["time_at_c"] = time_at_c
-        positional_data["enroute_sunrise_lat"] = coordinates[0]
-        positional_data["enroute_sunrise_long"] = coordinates[1]
-
-        coordinates_list.append(positional_data)
-
-        remaining_distance = great_circle(lonlat(coordinates[1], coordinates[0]),
-                                          lonlat(end_longitude, end_latitude)).kilometers
-        point += 1
-        enroute_coordinates.append({"lat": A[0], "long": A[1]})
-    travel_info["coordinates_list"] = coordinates_list
-    travel_info["total_duration"] = (tz_end_time - tz_start_time).seconds
-    final_results = process_positional_data(travel_info, tz_start_time, tz_end_time)
-    final_results["total_duration"] = time.strftime('%H:%M:%S', time.gmtime((tz_end_time - tz_start_time).seconds))
-    final_results["enroute_coordinates"] = enroute_coordinates
-    return final_results
+    route_length = geometry.route_length
+    altitude_at = get_route_altitude_function(geometry.line, start_timestamp, total_duration)
+
+    # returned geopoints, all taken from a single geodesic line from A to B, with sun's position
+    distances, latitudes, longitudes = geometry.get_output_points(output_step_km, max_points)
+    sun_positions, _, _, reaching_seconds = altitude_at(distances, with_azimuth=True,
+                                                        positions=(latitudes, longitudes))
+    altitudes = sun_positions["altitude"]
+
+    moon_altitudes = moon_fractions = None
+    if include_moon:
+        # moon only at the night points, from the same times and positions as the sun
+        night = np.flatnonzero(altitudes <= threshold)
+        night_timestamps = start_timestamp + reaching_seconds[night]
+        moon_altitudes = np.full(altitudes.shape, np.nan)
+        moon_fractions = np.full(altitudes.shape, np.nan)
+        moon_altitudes[night] = getMoonPositions(night_timestamps, latitudes[night], longitudes[night])["altitude"]
+        moon_fractions[night] = getMoonIlluminations(night_timestamps)["fraction"]
+
+    events = []
+    if crossing_method == "terminator":
+        crossings = get_terminator_crossings(geometry, start_timestamp, total_duration, horizon_altitude,
+                                             1 if crossing_tolerance is None else crossing_tolerance, altitude_at)
+        crossing_distances = np.array([distance for distance, _ in crossings])
+        crossing_latitudes, crossing_longitudes = get_line_positions(geometry.line, crossing_distances)
+        for (distance, direction), lat, lon in zip(crossings, crossing_latitudes.tolist(),
+                                                   crossing_longitudes.tolist()):
+            events.append(SunEvent("sunrise" if direction > 0 else "sunset", lat, lon,
+                                   start_timestamp + total_duration * distance / route_length))
+    elif crossing_method == "samples":
+        # sun samples used to find sunrise/sunset, independent of the returned points
+        if sampling_step_km is None:
+            sampling_step_km = 10 if crossing_tolerance is None else CROSSING_SEARCH_STEP_KM
+        sample_distances, sample_latitudes, sample_longitudes = geometry.get_sample_points(sampling_step_km)
+        if np.array_equal(sample_distances, distances):
+            sample_altitudes = altitudes
+        else:
+            sample_altitudes = altitude_at(sample_distances, positions=(sample_latitudes, sample_longitudes))
+        if threshold:
+            sample_altitudes = sample_altitudes - threshold
+        if crossing_tolerance is not None:
+            # samples only bracket the crossings, which are then refined to crossing_tolerance
+            xtol = crossing_tolerance * route_length / total_duration if total_duration else route_length
+
+        for index, kind in get_sun_transitions(sample_altitudes, start):
+            crossing = None
+            if crossing_tolerance is not None:
+                crossing = _refine_event(altitude_at, sample_distances[index - 1] if index else 0.0,
+                                         sample_distances[index], sample_altitudes[index], xtol, threshold)
+            if crossing is None:
+                seconds = total_duration * sample_distances[index] / route_length if route_length else 0
+                crossing = float(sample_latitudes[index]), float(sample_longitudes[index]), float(seconds)
+            events.append(SunEvent(kind, crossing[0], crossing[1], start_timestamp + crossing[2]))
+    else:
+        raise ValueError("unknown crossing_method %r, expected 'samples' or 'terminator'" % (crossing_method,))
+
+    travel_info = {"start": start, "end": end, "total_duration": total_duration}
+    night_seconds = calculate_night_seconds([event.timestamp for event in events if event.kind == "sunset"],
+                                            [event.timestamp for event in events if event.kind == "sunrise"],
+                                            travel_info, start_timestamp, end_timestamp)
+
+    epoch_ms = np.rint((start_timestamp + reaching_seconds) * 1000)
+    return RouteResult(start, end, travel_distance, total_duration, speed/1.852, get_roundoff_time(night_seconds),
+                       latitudes, longitudes, altitudes, epoch_ms, events, moon_altitudes, moon_fractions,
+                       _get_night_seconds(start, events, start_timestamp, end_timestamp))
+
+
+def get_flight_route_data(start_latitide, start_longitude, start_datetime, end_latitude, end_longitude, end_datetime,
+                          crossing_tolerance=None, sampling_step_km=None, output_step_km=10, max_points=None,
+                          geometry=None, crossing_method="samples", horizon_altitude=0, include_moon=False,
+                          geometry_backend="ellipsoidal"):
+    """
+    * Method to find sun's position during flight
+    ***
+        :params start_latitide : source's latitude
+        :params start_longitude : source's longitude
+        :params start_datetime : flight's departure time
+        :params end_latitude : destination's latitude
+        :params end_longitude : destination's latitude
+        :params end_datetime : flight's arrival latitude
+        :params crossing_tolerance : precision of sunrise/sunset times in seconds, when given each crossing is
+                                     refined with a root solver instead of being snapped to the sampling grid
+        :params sampling_step_km : spacing of the sun samples used to find sunrise/sunset, defaults to 10km,
+                                   or CROSSING_SEARCH_STEP_KM when crossing_tolerance is given
+        :params output_step_km : spacing of the returned enroute coordinates, None for none
+        :params max_points : maximum number of returned enroute coordinates
+        :params geometry : RouteGeometry of the route (e.g. from a RouteGeometryPool) to reuse across departures
+        :params crossing_method : "samples" finds sunrise/sunset from the sun samples, "terminator" solves for
+                                  them directly (see terminator.py) to crossing_tolerance, 1 second by default
+        :params horizon_altitude : sun's altitude in degrees separating day from night, 0 by default,
+                                   terminator.SUNRISE_ALTITUDE (-0.833) for the apparent sunrise/sunset
+        :params include_moon : when True, also give the moon's altitude and illuminated fraction at the enroute
+                               points where the sun is below horizon_altitude
+        :params geometry_backend : "ellipsoidal" (WGS84 geodesic) or "spherical" (great circle, faster), see
+                                   route_geometry.GEOMETRY_BACKENDS, unused when geometry is given
+
+    * return formatted dict with flight's route information
+    """
+    return get_flight_route_result(start_latitide, start_longitude, start_datetime, end_latitude, end_longitude,
+                                   end_datetime, crossing_tolerance, sampling_step_km, output_step_km,
+                                   max_points, geometry, crossing_method, horizon_altitude,
+                                   include_moon, geometry_backend).to_dict()
+
+
+def iter_route_points(start_latitide, start_longitude, start_datetime, end_latitude, end_longitude, end_datetime,
+                      crossing_tolerance=None, chunk_size=256, step_km=10, geometry_backend="ellipsoidal"):
+    """
+    * Generator streaming sun's position along the flight route
+    ***
+        :params start_latitide : source's latitude
+        :params start_longitude : source's longitude
+        :params start_datetime : flight's departure time
+        :params end_latitude : destination's latitude
+        :params end_longitude : destination's latitude
+        :params end_datetime : flight's arrival latitude
+        :params crossing_tolerance : precision of sunrise/sunset times in seconds, by default events are
+                                     reported at the first point past the crossing
+        :params chunk_size : number of points computed at once
+        :params step_km : distance between two points in km
+        :params geometry_backend : "ellipsoidal" or "spherical", see route_geometry.GEOMETRY_BACKENDS
+
+    * yield dicts in route order, with "type" being
+        point : index, lat, long, timestamp (epoch seconds), datetime, altitude, azimuth and state
+                ("day"/"night") of every step_km point
+        sunrise/sunset : lat, long, timestamp and datetime of an enroute sunrise/sunset, yielded before the point
+                         at which it was detected
+
+    Only one chunk of points is held at a time, so memory does not grow with the route length.
+    """
+    start_timestamp = parse_timestamp(start_datetime)
+    total_duration = _timedelta_seconds(parse_timestamp(end_datetime) - start_timestamp)
+
+    state = "day" if getPositions(start_timestamp, start_latitide, start_longitude)["altitude"] > 0 else "night"
+
+    line = get_route_line((start_latitide, start_longitude), (end_latitude, end_longitude), geometry_backend)
+    route_length = line.s13 / 1000
+    altitude_at = get_route_altitude_function(line, start_timestamp, total_duration)
+    xtol = crossing_tolerance * route_length / total_duration if crossing_tolerance and total_duration else 0
+    # the points of get_sample_distances
+    points_inbetween_coordinates = max(int(math.ceil(route_length / step_km)), 1)
+
+    previous_distance = 0.0
+    for chunk_start in range(0, points_inbetween_coordinates, chunk_size):
+        chunk_end = min(chunk_start + chunk_size, points_inbetween_coordinates)
+        distances = np.minimum(np.arange(chunk_start + 1, chunk_end + 1) * float(step_km), route_length)
+        sun_positions, latitudes, longitudes, reaching_seconds = altitude_at(distances, with_azimuth=True)
+
+        for point, (distance, lat, lon, seconds, azimuth, altitude) in enumerate(zip(
+                distances.tolist(), latitudes.tolist(), longitudes.tolist(), reaching_seconds.tolist(),
+                sun_positions["azimuth"].tolist(), sun_positions["altitude"].tolist()), chunk_start):
+            if (state == "day" and altitude < 0) or (state == "night" and altitude > 0):
+                state = "night" if state == "day" else "day"
+                event_lat, event_lon, event_seconds = lat, lon, seconds
+                if crossing_tolerance is not None:
+                    crossing = _refine_event(altitude_at, previous_distance, distance, altitude, xtol)
+                    if crossing is not None:
+                        event_lat, event_lon, event_seconds = crossing
+                yield {"type": "sunset" if state == "night" else "sunrise", "lat": event_lat, "long": event_lon,
+                       "timestamp": start_timestamp + event_seconds,
+                       "datetime": datetime.fromtimestamp(start_timestamp + event_seconds, timezone.utc)}
+            yield {"type": "point", "index": point, "lat": lat, "long": lon, "timestamp": start_timestamp + seconds,
+                   "datetime": datetime.fromtimestamp(start_timestamp + seconds, timezone.utc),
+                   "altitude": altitude, "azimuth": azimuth, "state": state}
+            previous_distance = distance
@@ -0,0 +1,252 @@
+"""
+    flight_route_plotter multi-leg itinerary file
+"""
+import time
+from concurrent import futures
+from datetime import datetime
+
+from . batch import _get_executor
+from . ephemeris import _using_ephemeris
+from . flight_locator import DATETIME_FORMAT, _format_duration, _to_timestamp, get_flight_route_result, parse_timestamp
+from . route_geometry import RouteGeometryPool
+
+__all__ = ["ItineraryResult", "get_itinerary_result", "get_itinerary_data"]
+
+# accepted keys of a waypoint mapping
+_LATITUDE_KEYS = ("lat", "latitude")
+_LONGITUDE_KEYS = ("long", "lon", "longitude")
+
+
+def _get_timestamp(value):
+    """
+    * Method to read a waypoint time given as flight datetime string, datetime or epoch seconds
+    * return epoch seconds or None
+    """
+    if value is None:
+        return None
+    if isinstance(value, str):
+        return parse_timestamp(value)
+    if isinstance(value, datetime):
+        return _to_timestamp(value)
+    return float(value)
+
+
+def _get_value(waypoint, keys):
+    for key in keys:
+        if key in waypoint:
+            return waypoint[key]
+    raise KeyError("waypoint has no %s field" % keys[0])
+
+
+def _parse_waypoint(waypoint):
+    """
+    * Method to read a waypoint
+    ***
+        :params waypoint: (lat, long), (lat, long, datetime) or mapping with lat/long and optionally
+                          datetime (arrival and departure), arrival, departure, ground_time (seconds) and
+                          speed (knots, of the leg leaving the waypoint)
+    * return dict with lat, long, arrival, departure, ground_time and speed
+    """
+    if not hasattr(waypoint, "keys"):
+        waypoint = tuple(waypoint)
+        if len(waypoint) not in (2, 3):
+            raise ValueError("waypoint must be (lat, long) or (lat, long, datetime), got %r" % (waypoint,))
+        waypoint = {"lat": waypoint[0], "long": waypoint[1], "datetime": waypoint[2] if len(waypoint) == 3 else None}
+    moment = _get_timestamp(waypoint.get("datetime"))
+    arrival = _get_timestamp(waypoint.get("arrival"))
+    departure = _get_timestamp(waypoint.get("departure"))
+    return {
+        "lat": float(_get_value(waypoint, _LATITUDE_KEYS)),
+        "long": float(_get_value(waypoint, _LONGITUDE_KEYS)),
+        "arrival": moment if arrival is None else arrival,
+        "departure": moment if departure is None else departure,
+        "ground_time": float(waypoint.get("ground_time") or 0),
+        "speed": waypoint.get("speed"),
+    }
+
+
+def _resolve_times(waypoints, distances, speed):
+    """
+    * Method to fill in the missing arrival and departure times of the waypoints
+    ***
+        :params waypoints: list of _parse_waypoint dicts, updated in place
+        :params distances: length in km of every leg
+        :params speed: default speed in knots of the legs, None to interpolate between timed waypoints
+
+    A departure missing is the arrival plus the ground time. An arrival missing comes from the
+    speed of the leg when one is given, otherwise from the next timed waypoint, the time in between
+    being shared between the legs in proportion to their length.
+    """
+    first = waypoints[0]
+    if first["departure"] is None:
+        raise ValueError("the first waypoint needs a departure time")
+    for index in range(1, len(waypoints)):
+        previous, waypoint = waypoints[index - 1], waypoints[index]
+        if waypoint["arrival"] is None:
+            leg_speed = previous["speed"] if previous["speed"] is not None else speed
+            if leg_speed is not None:
+                waypoint["arrival"] = previous["departure"] + 3600 * distances[index - 1] / (float(leg_speed) * 1.852)
+            else:
+                # next waypoint with a time, and the flying time left until then
+                for later in range(index, len(waypoints)):
+                    target = waypoints[later]["arrival"]
+                    if target is None and later > index:
+                        target = waypoints[later]["departure"]
+                    if target is not None:
+                        break
+                else:
+                    raise ValueError("waypoint %d has no time, and no speed is given to compute it" % index)
+                flying = target - previous["departure"] - sum(waypoints[k]["ground_time"]
+                                                               for k in range(index, later))
+                if later > index and waypoints[later]["arrival"] is None:
+                    flying -= waypoints[later]["ground_time"]
+                length = sum(distances[index - 1:later])
+                waypoint["arrival"] = previous["departure"] + (flying * distances[index - 1] / length if length else 0)
+        if waypoint["departure"] is None:
+            waypoint["departure"] = waypoint["arrival"] + waypoint["ground_time"]
+        if waypoint["arrival"] < previous["departure"]:
+            raise ValueError("waypoint %d is reached before the previous one is left" % index)
+        if waypoint["departure"] < waypoint["arrival"]:
+            raise ValueError("waypoint %d is left before it is reached" % index)
+    # legs are computed on whole seconds
+    for waypoint in waypoints:
+        waypoint["arrival"] = None if waypoint["arrival"] is None else int(round(waypoint["arrival"]))
+        waypoint["departure"] = int(round(waypoint["departure"]))
+
+
+class ItineraryResult(object):
+    """
+    * Sun's position during a multi-leg itinerary
+    ***
+        legs : list of RouteResult, one per leg in itinerary order
+        departures, arrivals : epoch seconds at which every leg departs and arrives
+        start : "day" or "night" at the first departure
+        end : "day" or "night" at the last arrival
+        travel_distance : sum of the legs' distances in km
+        flight_seconds : time in the air, ground times excluded
+        night_seconds : time in the air at night, from the sun's state along the whole trip
+        events : list of (leg index, SunEvent) in trip order
+    """
+    __slots__ = ("legs", "departures", "arrivals", "start", "end", "travel_distance", "flight_seconds",
+                 "night_seconds", "events")
+
+    def __init__(self, legs, departures, arrivals):
+        self.legs = legs
+        self.departures = departures
+        self.arrivals = arrivals
+        self.start = legs[0].start
+        self.end = legs[-1].end
+        self.travel_distance = sum(leg.travel_distance for leg in legs)
+        self.flight_seconds = sum(arrival - departure for departure, arrival in zip(departures, arrivals))
+        self.night_seconds = sum(leg.night_seconds for leg in legs)
+        self.events = [(index, event) for index, leg in enumerate(legs) for event in leg.events]
+
+    def __len__(self):
+        return len(self.legs)
+
+    def __repr__(self):
+        return "<ItineraryResult %s->%s %.1fkm, %d legs, %d events>" % (
+            self.start, self.end, self.travel_distance, len(self), len(self.events))
+
+    def to_dict(self):
+        """
+        * Method to convert the itinerary into a dict, with the get_flight_route_data dict of every leg
+        """
+        def get_event_info(index, event):
+            info = event.to_dict()
+            info["leg"] = index
+            return info
+
+        legs = []
+        for leg, departure, arrival in zip(self.legs, self.departures, self.arrivals):
+            leg_data = leg.to_dict()
+            leg_data["departure_datetime"] = time.strftime(DATETIME_FORMAT, time.gmtime(departure))
+            leg_data["arrival_datetime"] = time.strftime(DATETIME_FORMAT, time.gmtime(arrival))
+            legs.append(leg_data)
+        return {
+            "start": self.start,
+            "end": self.end,
+            "travel_distance": self.travel_distance,
+            "flight_duration": _format_duration(self.flight_seconds),
+            "elapsed_duration": _format_duration(self.arrivals[-1] - self.departures[0]),
+            "night_duration": _format_duration(60 * round(self.night_seconds / 60)),
+            "point_sunset_info": [get_event_info(index, event) for index, event in self.events
+                                  if event.kind == "sunset"],
+            "point_sunrise_info": [get_event_info(index, event) for index, event in self.events
+                                   if event.kind == "sunrise"],
+            "legs": legs,
+        }
+
+
+def _get_leg_result(args, options):
+    return get_flight_route_result(*args, **options)
+
+
+def get_itinerary_result(waypoints, speed=None, executor="serial", max_workers=None, ephemeris=None,
+                         geometry_pool=None, **options):
+    """
+    * Method to find sun's position during a multi-leg itinerary or along a flight plan's waypoints
+    ***
+        :params waypoints: ordered waypoints, each (lat, long), (lat, long, datetime) or a mapping with lat/long
+                           and optionally datetime, arrival, departure, ground_time (seconds) and speed (knots,
+                           of the leg leaving it), datetimes being flight datetime strings, datetimes or epoch
+                           seconds; the first one needs a departure
+        :params speed: speed in knots of the legs without times, None to share the time between two timed
+                       waypoints in proportion to the legs' lengths
+        :params executor: "serial", "thread", "process" or a concurrent.futures Executor running the legs
+        :params max_workers: number of workers of a new executor
+        :params ephemeris: path of a saved EphemerisTable used by every leg, during the call only
+        :params geometry_pool: RouteGeometryPool shared with other calls, e.g. for a recurring itinerary
+        :params options: keyword arguments passed to get_flight_route_result, e.g. crossing_tolerance
+    * return ItineraryResult
+
+    Legs are independent flights, so they run in parallel on an executor, and a leg flown twice
+    (e.g. a shuttle) shares its RouteGeometry. The trip's night time is added up from the sun's
+    state along every leg, so it is exact past 24 hours.
+    """
+    waypoints = [_parse_waypoint(waypoint) for waypoint in waypoints]
+    if len(waypoints) < 2:
+        raise ValueError("an itinerary needs at least two waypoints")
+    geometry_pool = geometry_pool or RouteGeometryPool(backend=options.get("geometry_backend", "ellipsoidal"))
+    geometries = [geometry_pool.get((start["lat"], start["long"]), (end["lat"], end["long"]))
+                  for start, end in zip(waypoints[:-1], waypoints[1:])]
+    _resolve_times(waypoints, [geometry.travel_distance for geometry in geometries], speed)
+
+    departures = [waypoint["departure"] for waypoint in waypoints[:-1]]
+    arrivals = [waypoint["arrival"] for waypoint in waypoints[1:]]
+    legs = [(start["lat"], start["long"], time.strftime(DATETIME_FORMAT, time.gmtime(departure)),
+             end["lat"], end["long"], time.strftime(DATETIME_FORMAT, time.gmtime(arrival)))
+            for start, end, departure, arrival in zip(waypoints[:-1], waypoints[1:], departures, arrivals)]
+
+    serial = executor == "serial" or len(legs) == 1
+    # legs run in this process use the table for this call only, worker processes load it themselves
+    with _using_ephemeris(ephemeris if serial or executor == "thread" else None):
+        if serial:
+            results = [get_flight_route_result(*args, geometry=geometry, **options)
+                       for args, geometry in zip(legs, geometries)]
+        else:
+            pool, owned = _get_executor(executor, max_workers or len(legs), ephemeris)
+            # worker processes build their own geometry, threads share the pool's
+            processes = isinstance(pool, futures.ProcessPoolExecutor)
+            leg_options = [options if processes else dict(options, geometry=geometry) for geometry in geometries]
+            try:
+                results = list(pool.map(_get_leg_result, legs, leg_options))
+            finally:
+                if owned:
+                    pool.shutdown()
+    return ItineraryResult(results, departures, arrivals)
+
+
+def get_itinerary_data(waypoints, speed=None, executor="serial", max_workers=None, ephemeris=None,
+                       geometry_pool=None, **options):
+    """
+    * Method to find sun's position during a multi-leg itinerary or along a flight plan's waypoints
+    ***
+        :params see get_itinerary_result
+    * return dict with the trip's start, end, travel_distance, flight_duration (in the air),
+             elapsed_duration (first departure to last arrival), night_duration, sunset/sunrise info
+             of every leg (with its "leg" index) and the get_flight_route_data dict of every leg
+             under "legs", with its departure_datetime and arrival_datetime
+    """
+    return get_itinerary_result(waypoints, speed, executor, max_workers, ephemeris, geometry_pool,
+                                **options).to_dict()
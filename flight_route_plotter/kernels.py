@@ -0,0 +1,313 @@
+"""
+    flight_route_plotter compiled kernels file
+
+    Inner loops of the pipeline written as plain loops over arrays, compiled with Numba when it
+    is installed (it is not a dependency). Without Numba, or with FLIGHT_ROUTE_PLOTTER_JIT=0 in
+    the environment, the numpy/Python versions of the other modules are used, with the same results
+    to rounding:
+
+        sun positions       suncalc_v2.getPositions
+        geodesic positions  route_geometry.get_line_positions
+        day/night changes   flight_locator.get_sun_transitions
+        moon rise/set       suncalc_v2.getMoonTimes
+
+    Numba is imported, and the kernels compiled (and cached on disk), on first use only. When
+    that fails, e.g. Numba not supporting the installed NumPy, the compiled kernels are switched
+    off with a warning and the numpy/Python versions are used from then on.
+"""
+import importlib.util
+import math
+import os
+import warnings
+
+# a real module, as compiled kernels resolve their globals; the other modules import this one lazily
+import numpy as np
+
+__all__ = ["JIT_ENVIRONMENT_VARIABLE", "is_jit_enabled", "set_jit_enabled", "sun_transitions", "moon_rise_set",
+           "sun_positions", "line_positions"]
+
+JIT_ENVIRONMENT_VARIABLE = "FLIGHT_ROUTE_PLOTTER_JIT"
+
+# None until the first kernel call
+_jit_enabled = None
+# python kernel -> compiled kernel
+_compiled = {}
+
+# geographiclib's Geodesic.tiny_
+_TINY = math.sqrt(2.0 ** -1022)
+
+
+def is_jit_enabled():
+    """
+    * Method to know whether the compiled kernels are used
+    * return True when Numba is installed and FLIGHT_ROUTE_PLOTTER_JIT is not "0"
+    """
+    global _jit_enabled
+    if _jit_enabled is None:
+        _jit_enabled = os.environ.get(JIT_ENVIRONMENT_VARIABLE, "1") != "0" and \
+            importlib.util.find_spec("numba") is not None
+    return _jit_enabled
+
+
+def set_jit_enabled(enabled):
+    """
+    * Method to switch the compiled kernels on or off in this process
+    ***
+        :params enabled: use the compiled kernels, ignored when Numba is not installed
+    * return whether the compiled kernels are used
+    """
+    global _jit_enabled
+    _jit_enabled = bool(enabled) and importlib.util.find_spec("numba") is not None
+    return _jit_enabled
+
+
+def _get_compiled(kernel, helpers=()):
+    function = _compiled.get(kernel)
+    if function is None:
+        import numba
+        import numba.extending
+        for helper in helpers:
+            numba.extending.register_jitable(helper)
+        function = _compiled[kernel] = numba.njit(cache=True, nogil=True)(kernel)
+    return function
+
+
+def _call_compiled(kernel, args, helpers=()):
+    """
+    * Method to run the compiled version of a kernel
+    ***
+        :params kernel: python kernel
+        :params args: arguments of the kernel
+        :params helpers: python functions called by the kernel
+    * return result of the kernel, or None when Numba fails to import or compile it, the compiled
+             kernels being then switched off
+    """
+    global _jit_enabled
+    try:
+        return _get_compiled(kernel, helpers)(*args)
+    except Exception as exc:
+        _jit_enabled = False
+        warnings.warn("compiled kernels switched off, numba failed on %s: %s: %s"
+                      % (kernel.__name__, type(exc).__name__, exc), RuntimeWarning)
+        return None
+
+
+def _sun_transitions_loop(altitudes, state):
+    # state and directions: 1 for day/sunrise, -1 for night/sunset
+    indices = np.empty(altitudes.shape[0], np.int64)
+    directions = np.empty(altitudes.shape[0], np.int8)
+    count = 0
+    for index in range(altitudes.shape[0]):
+        altitude = altitudes[index]
+        if (state == 1 and altitude < 0) or (state == -1 and altitude > 0):
+            state = -state
+            indices[count] = index
+            directions[count] = state
+            count += 1
+    return indices[:count], directions[:count]
+
+
+def sun_transitions(altitudes, state):
+    """
+    * Method to find the points at which the flight passes from day to night or night to day
+    ***
+        :params altitudes: sun's altitude at every enroute point
+        :params state: "day" or "night" at departure
+    * return point indices and directions, 1 for a sunrise and -1 for a sunset, as arrays (compiled) or lists
+
+    The day/night state machine of get_sun_transitions: day turns into night below 0, night
+    into day above it, a point at 0 keeps the state.
+    """
+    start = 1 if state == "day" else -1
+    if is_jit_enabled():
+        result = _call_compiled(_sun_transitions_loop, (np.ascontiguousarray(altitudes, dtype=np.float64), start))
+        if result is not None:
+            return result
+    # the loop on Python floats beats any numpy formulation on the few hundred points of a flight
+    indices, directions = [], []
+    for index, altitude in enumerate(altitudes.tolist() if hasattr(altitudes, "tolist") else altitudes):
+        if (start == 1 and altitude < 0) or (start == -1 and altitude > 0):
+            start = -start
+            indices.append(index)
+            directions.append(start)
+    return indices, directions
+
+
+def _moon_rise_set_loop(h):
+    rise = 0.0
+    sett = 0.0
+    ye = 0.0
+    h0 = h[0]
+    # go in 2-hour chunks, each time seeing if a 3-point quadratic curve crosses zero (which means rise or set)
+    for i in range(1, 24, 2):
+        h1 = h[i]
+        h2 = h[i + 1]
+
+        a = (h0 + h2) / 2 - h1
+        b = (h2 - h0) / 2
+        xe = -b / (2 * a)
+        ye = (a * xe + b) * xe + h1
+        d = b * b - 4 * a * h1
+        roots = 0
+        x1 = 0.0
+        x2 = 0.0
+
+        if d >= 0:
+            dx = math.sqrt(d) / (abs(a) * 2)
+            x1 = xe - dx
+            x2 = xe + dx
+            if abs(x1) <= 1:
+                roots += 1
+            if abs(x2) <= 1:
+                roots += 1
+            if x1 < -1:
+                x1 = x2
+
+        if roots == 1:
+            if h0 < 0:
+                rise = i + x1
+            else:
+                sett = i + x1
+
+        elif roots == 2:
+            rise = i + (x2 if ye < 0 else x1)
+            sett = i + (x1 if ye < 0 else x2)
+
+        if rise and sett:
+            break
+
+        h0 = h2
+    return rise, sett, ye
+
+
+def moon_rise_set(h):
+    """
+    * Method to find moonrise and moonset from the moon's altitude at every hour of a day
+    ***
+        :params h: 25 altitudes in radians, from hour 0 to hour 24, minus the altitude of the rise/set
+    * return (rise, set, ye), rise and set in hours (0 when there is none), ye the altitude of the last
+             parabola's extremum, telling whether the moon is always up or down
+    """
+    if is_jit_enabled():
+        result = _call_compiled(_moon_rise_set_loop, (np.ascontiguousarray(h, dtype=np.float64),))
+        if result is not None:
+            return result
+    return _moon_rise_set_loop(np.asarray(h, dtype=np.float64).tolist())
+
+
+def _sun_positions_loop(d, lw, phi, rad, sin_e, cos_e):
+    azimuths = np.empty(d.shape[0])
+    altitudes = np.empty(d.shape[0])
+    for index in range(d.shape[0]):
+        days = d[index]
+        M = rad * (357.5291 + 0.98560028 * days)
+        C = rad * (1.9148 * math.sin(M) + 0.02 * math.sin(2 * M) + 0.0003 * math.sin(3 * M))
+        L = M + C + rad * 102.9372 + math.pi
+        sinL = math.sin(L)
+        dec = math.asin(sinL * sin_e)
+        ra = math.atan2(sinL * cos_e, math.cos(L))
+
+        H = rad * (280.16 + 360.9856235 * days) - lw[index] - ra
+        sinPhi, cosPhi = math.sin(phi[index]), math.cos(phi[index])
+        sinDec, cosDec = math.sin(dec), math.cos(dec)
+        cosH = math.cos(H)
+        azimuths[index] = math.atan2(math.sin(H), cosH * sinPhi - sinDec / cosDec * cosPhi)
+        altitudes[index] = math.asin(sinPhi * sinDec + cosPhi * cosDec * cosH)
+    return azimuths, altitudes
+
+
+def sun_positions(d, lw, phi, rad, e):
+    """
+    * Method to get sun's azimuth and altitude with the compiled kernel, see suncalc_v2.getPositions
+    ***
+        :params d: days since J2000
+        :params lw: west longitudes in radians
+        :params phi: latitudes in radians
+        :params rad: radians per degree
+        :params e: obliquity of the Earth in radians
+    * return dict with azimuth and altitude arrays of the broadcast shape of the inputs, None when the
+             kernel cannot be compiled
+    """
+    d, lw, phi = np.broadcast_arrays(d, lw, phi)
+    shape = d.shape
+    result = _call_compiled(_sun_positions_loop, (
+        np.ascontiguousarray(d, dtype=np.float64).ravel(), np.ascontiguousarray(lw, dtype=np.float64).ravel(),
+        np.ascontiguousarray(phi, dtype=np.float64).ravel(), rad, math.sin(e), math.cos(e)))
+    if result is None:
+        return None
+    azimuths, altitudes = result
+    return dict(azimuth=azimuths.reshape(shape), altitude=altitudes.reshape(shape))
+
+
+def _sin_cos_series(sinx, cosx, c):
+    # geographiclib's sine series with Clenshaw summation, c[0] unused
+    k = c.shape[0]
+    n = k - 1
+    ar = 2 * (cosx - sinx) * (cosx + sinx)
+    y1 = 0.0
+    y0 = 0.0
+    if n & 1:
+        k -= 1
+        y0 = c[k]
+    n = n // 2
+    while n:
+        n -= 1
+        k -= 1
+        y1 = ar * y0 - y1 + c[k]
+        k -= 1
+        y0 = ar * y1 - y0 + c[k]
+    return 2 * sinx * cosx * y0
+
+
+def _line_positions_loop(s12, b, A1m1, stau1, ctau1, C1pa, B11, ssig1, csig1, calp0, salp0, somg1, comg1, A3c, C3a,
+                         B31, f1, lon1, tiny):
+    latitudes = np.empty(s12.shape[0])
+    longitudes = np.empty(s12.shape[0])
+    E = math.copysign(1.0, salp0)
+    sig1 = math.atan2(ssig1, csig1)
+    omg1 = math.atan2(E * somg1, comg1)
+    for index in range(s12.shape[0]):
+        tau12 = s12[index] / (b * (1 + A1m1))
+        s = math.sin(tau12)
+        c = math.cos(tau12)
+        B12 = -_sin_cos_series(stau1 * c + ctau1 * s, ctau1 * c - stau1 * s, C1pa)
+        sig12 = tau12 - (B12 - B11)
+        ssig12 = math.sin(sig12)
+        csig12 = math.cos(sig12)
+
+        ssig2 = ssig1 * csig12 + csig1 * ssig12
+        csig2 = csig1 * csig12 - ssig1 * ssig12
+        sbet2 = calp0 * ssig2
+        cbet2 = math.hypot(salp0, calp0 * csig2)
+        if cbet2 == 0:
+            cbet2 = tiny
+
+        somg2 = salp0 * ssig2
+        omg12 = E * (sig12 - (math.atan2(ssig2, csig2) - sig1) + (math.atan2(E * somg2, csig2) - omg1))
+        lam12 = omg12 + A3c * (sig12 + (_sin_cos_series(ssig2, csig2, C3a) - B31))
+
+        latitudes[index] = math.degrees(math.atan2(sbet2, f1 * cbet2))
+        longitudes[index] = (lon1 + math.degrees(lam12) + 180) % 360 - 180
+    return latitudes, longitudes
+
+
+def line_positions(line, distances_km):
+    """
+    * Method to get coordinates along a geographiclib GeodesicLine with the compiled kernel, see
+      route_geometry.get_line_positions
+    ***
+        :params line: GeodesicLine
+        :params distances_km: distances from the start of the line in km
+    * return latitudes and longitudes arrays in degrees, of the shape of distances_km, None when the kernel
+             cannot be compiled
+    """
+    distances = np.asarray(distances_km, dtype=np.float64)
+    result = _call_compiled(_line_positions_loop, (
+        np.ascontiguousarray(distances).ravel() * 1000, line._b, line._A1m1, line._stau1, line._ctau1,
+        np.asarray(line._C1pa, dtype=np.float64), line._B11, line._ssig1, line._csig1, line._calp0, line._salp0,
+        line._somg1, line._comg1, line._A3c, np.asarray(line._C3a, dtype=np.float64), line._B31, line._f1,
+        line.lon1, _TINY), (_sin_cos_series,))
+    if result is None:
+        return None
+    latitudes, longitudes = result
+    return latitudes.reshape(distances.shape), longitudes.reshape(distances.shape)
@@ -0,0 +1,154 @@
+"""
+    flight_route_plotter per-stage profiling file
+
+    Pipeline stages record call counts, cumulative wall time and processed points once
+    profiling is enabled:
+
+        geometry        route_geometry.get_line_positions (geodesic positions)
+        solar           suncalc_v2.getPositions (sun's altitude/azimuth)
+        lunar           suncalc_v2.getMoonPositions (moon's altitude/azimuth)
+        classification  flight_locator.get_sun_transitions (day/night state machine)
+        night_hours     flight_locator.calculate_night_seconds
+        route           flight_locator.get_flight_route_result (a whole flight)
+
+    When profiling is disabled a stage costs one extra function call and a flag check.
+    Stats are kept per process.
+"""
+import threading
+import time
+from functools import wraps
+
+__all__ = ["enable_profiling", "disable_profiling", "is_profiling_enabled", "profiling", "reset_profiling_stats",
+           "get_profiling_stats", "export_prometheus", "add_profiling_callback", "remove_profiling_callback",
+           "record_stage", "timed_stage"]
+
+_enabled = False
+_lock = threading.Lock()
+# stage name -> [calls, seconds, points]
+_stats = {}
+_callbacks = []
+
+
+def enable_profiling():
+    global _enabled
+    _enabled = True
+
+
+def disable_profiling():
+    global _enabled
+    _enabled = False
+
+
+def is_profiling_enabled():
+    return _enabled
+
+
+class profiling(object):
+    """
+    * Context manager enabling profiling inside a block
+    ***
+        :params reset: clear the stats collected so far when entering the block
+    * as target: the profiling module's get_profiling_stats, to read the stats after the block
+    """
+
+    def __init__(self, reset=True):
+        self.reset = reset
+        self.was_enabled = False
+
+    def __enter__(self):
+        self.was_enabled = _enabled
+        if self.reset:
+            reset_profiling_stats()
+        enable_profiling()
+        return get_profiling_stats
+
+    def __exit__(self, *exc_info):
+        if not self.was_enabled:
+            disable_profiling()
+        return False
+
+
+def reset_profiling_stats():
+    with _lock:
+        _stats.clear()
+
+
+def get_profiling_stats():
+    """
+    * Method to get the collected stats
+    * return dict of stage name to dict with calls, seconds and points
+    """
+    with _lock:
+        return {stage: {"calls": calls, "seconds": seconds, "points": points}
+                for stage, (calls, seconds, points) in _stats.items()}
+
+
+def export_prometheus(prefix="flight_route_plotter"):
+    """
+    * Method to export the collected stats in the Prometheus text exposition format
+    ***
+        :params prefix: metric name prefix
+    * return str
+    """
+    stats = get_profiling_stats()
+    lines = []
+    for metric, key, description in (("stage_calls_total", "calls", "Number of calls of a pipeline stage."),
+                                     ("stage_seconds_total", "seconds", "Wall time spent in a pipeline stage."),
+                                     ("stage_points_total", "points", "Route points processed by a pipeline stage.")):
+        name = "%s_%s" % (prefix, metric)
+        lines.append("# HELP %s %s" % (name, description))
+        lines.append("# TYPE %s counter" % name)
+        for stage in sorted(stats):
+            lines.append('%s{stage="%s"} %r' % (name, stage, stats[stage][key]))
+    return "\n".join(lines) + "\n"
+
+
+def add_profiling_callback(callback):
+    """
+    * Method to register a callback(stage, seconds, points) called for every recorded stage
+    """
+    _callbacks.append(callback)
+
+
+def remove_profiling_callback(callback):
+    _callbacks.remove(callback)
+
+
+def record_stage(stage, seconds, points=0):
+    """
+    * Method to add one call of a stage to the stats
+    ***
+        :params stage: stage name
+        :params seconds: wall time of the call
+        :params points: number of route points processed by the call
+    """
+    with _lock:
+        entry = _stats.get(stage)
+        if entry is None:
+            _stats[stage] = [1, seconds, points]
+        else:
+            entry[0] += 1
+            entry[1] += seconds
+            entry[2] += points
+    for callback in _callbacks:
+        callback(stage, seconds, points)
+
+
+def timed_stage(stage, points=None):
+    """
+    * Decorator recording the calls of a function as a pipeline stage
+    ***
+        :params stage: stage name
+        :params points: optional function(args, result) giving the number of processed points
+    """
+    def decorator(function):
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return function(*args, **kwargs)
+            start = time.perf_counter()
+            result = function(*args, **kwargs)
+            record_stage(stage, time.perf_counter() - start, points(args, result) if points else 0)
+            return result
+        return wrapper
+    return decorator
@@ -0,0 +1,336 @@
+"""
+    flight_route_plotter route geometry file
+"""
+import collections
+import math
+import threading
+
+from . _lazy import lazy_import
+from . profiling import timed_stage
+
+np = lazy_import("numpy")
+_geodesic = lazy_import("geographiclib.geodesic")
+_kernels = lazy_import("flight_route_plotter.kernels")
+
+__all__ = ["EARTH_RADIUS", "GEOMETRY_BACKENDS", "get_great_circle_distance", "SphericalLine", "get_route_line",
+           "get_line_positions", "get_sample_distances", "get_output_distances", "get_route_samples", "RouteGeometry",
+           "RouteGeometryPool"]
+
+# mean earth radius in km, as used by geopy's great_circle
+EARTH_RADIUS = 6371.009
+
+# "ellipsoidal" follows the WGS84 geodesic with geographiclib, "spherical" the great circle on a sphere of
+# radius EARTH_RADIUS without any geographiclib call; see the README for the measured differences
+GEOMETRY_BACKENDS = ("ellipsoidal", "spherical")
+
+
+def _sin_cos_series(sinx, cosx, c):
+    """
+    * Method to evaluate geographiclib's sine series with Clenshaw summation over arrays
+    ***
+        :params sinx: array of sin(x)
+        :params cosx: array of cos(x)
+        :params c: series coefficients (c[0] is unused)
+    * return array of sum(c[i] * sin(2 * i * x))
+    """
+    k = len(c)
+    n = k - 1
+    ar = 2 * (cosx - sinx) * (cosx + sinx)
+    y1 = np.zeros_like(sinx)
+    if n & 1:
+        k -= 1
+        y0 = np.full_like(sinx, c[k])
+    else:
+        y0 = np.zeros_like(sinx)
+    n = n // 2
+    while n:
+        n -= 1
+        k -= 1
+        y1 = ar * y0 - y1 + c[k]
+        k -= 1
+        y0 = ar * y1 - y0 + c[k]
+    return 2 * sinx * cosx * y0
+
+
+def get_great_circle_distance(start_point, end_point):
+    """
+    * Method to calculate the great circle distance between two coordinates.
+
+    ***
+        :param: start_point: start coordinate
+        :param: end_point: end coordinate
+
+    * return float: distance in km on a sphere of radius EARTH_RADIUS"""
+    lat1 = math.radians(start_point[0])
+    lat2 = math.radians(end_point[0])
+    delta_lon = math.radians(end_point[1] - start_point[1])
+
+    y = math.hypot(math.cos(lat2) * math.sin(delta_lon),
+                   math.cos(lat1) * math.sin(lat2) - math.sin(lat1) * math.cos(lat2) * math.cos(delta_lon))
+    x = math.sin(lat1) * math.sin(lat2) + math.cos(lat1) * math.cos(lat2) * math.cos(delta_lon)
+    return EARTH_RADIUS * math.atan2(y, x)
+
+
+class SphericalLine(object):
+    """
+    * Great circle between two coordinates on a sphere of radius EARTH_RADIUS
+    ***
+        :params A: start coordinate
+        :params B: end coordinate
+
+    Has the attributes of a GeodesicLine used here: lat1, lon1, azi1 (initial azimuth in
+    degrees), a13 (arc length in degrees) and s13 (length in meters).
+    """
+
+    def __init__(self, A, B):
+        self.lat1, self.lon1 = float(A[0]), float(A[1])
+        lat, lon = math.radians(self.lat1), math.radians(self.lon1)
+        self.a = (math.cos(lat) * math.cos(lon), math.cos(lat) * math.sin(lon), math.sin(lat))
+        east = (-math.sin(lon), math.cos(lon), 0.0)
+        north = (-math.sin(lat) * math.cos(lon), -math.sin(lat) * math.sin(lon), math.cos(lat))
+
+        lat2, lon2 = math.radians(B[0]), math.radians(B[1])
+        b = (math.cos(lat2) * math.cos(lon2), math.cos(lat2) * math.sin(lon2), math.sin(lat2))
+        cos_arc = sum(x * y for x, y in zip(self.a, b))
+        # direction of B seen from A, north for B at or opposite to A
+        u = [y - cos_arc * x for x, y in zip(self.a, b)]
+        norm = math.sqrt(sum(x * x for x in u))
+        self.a13 = math.degrees(math.atan2(norm, cos_arc))
+        if norm < 1e-15:
+            u, norm = list(north), 1.0
+        self.u = tuple(x / norm for x in u)
+        self.azi1 = math.degrees(math.atan2(sum(x * y for x, y in zip(self.u, east)),
+                                            sum(x * y for x, y in zip(self.u, north))))
+        self.s13 = math.radians(self.a13) * EARTH_RADIUS * 1000
+
+    def __repr__(self):
+        return "<SphericalLine (%r, %r) azi1=%.3f %.1fkm>" % (self.lat1, self.lon1, self.azi1, self.s13 / 1000)
+
+
+def get_route_line(A, B, backend="ellipsoidal"):
+    """
+    * Method to get the geodesic line between two coordinates
+    ***
+        :params A: start coordinate
+        :params B: end coordinate
+        :params backend: "ellipsoidal" or "spherical", see GEOMETRY_BACKENDS
+    * return geographiclib GeodesicLine, or SphericalLine, from A to B, its length is line.s13 in meters
+    """
+    if backend == "spherical":
+        return SphericalLine(A, B)
+    if backend != "ellipsoidal":
+        raise ValueError("unknown geometry backend %r, expected one of %s" % (backend, ", ".join(GEOMETRY_BACKENDS)))
+    return _geodesic.Geodesic.WGS84.InverseLine(A[0], A[1], B[0], B[1])
+
+
+def _get_great_circle_positions(line, distances_km):
+    """
+    * Method to get coordinates at given distances along a SphericalLine
+    ***
+        :params line: SphericalLine
+        :params distances_km: distances from the start of the line in km
+    * return latitudes and longitudes arrays in degrees
+    """
+    angles = np.asarray(distances_km, dtype=float) / EARTH_RADIUS
+    cos_angles, sin_angles = np.cos(angles), np.sin(angles)
+    x = line.a[0] * cos_angles + line.u[0] * sin_angles
+    y = line.a[1] * cos_angles + line.u[1] * sin_angles
+    z = line.a[2] * cos_angles + line.u[2] * sin_angles
+    return np.degrees(np.arctan2(z, np.hypot(x, y))), np.degrees(np.arctan2(y, x))
+
+
+@timed_stage("geometry", lambda args, result: result[0].size)
+def get_line_positions(line, distances_km):
+    """
+    * Method to get coordinates at given distances along a geodesic line in one vectorized pass
+    ***
+        :params line: GeodesicLine or SphericalLine from get_route_line
+        :params distances_km: distances from the start of the line in km
+    * return latitudes and longitudes arrays in degrees
+
+    This is GeodesicLine.Position evaluated for a whole array of distances at
+    once, so no error builds up from point to point.
+    """
+    if isinstance(line, SphericalLine):
+        return _get_great_circle_positions(line, distances_km)
+    if _kernels.is_jit_enabled():
+        positions = _kernels.line_positions(line, distances_km)
+        if positions is not None:
+            return positions
+    s12 = np.asarray(distances_km, dtype=float) * 1000
+    tau12 = s12 / (line._b * (1 + line._A1m1))
+    s = np.sin(tau12)
+    c = np.cos(tau12)
+    B12 = -_sin_cos_series(line._stau1 * c + line._ctau1 * s,
+                           line._ctau1 * c - line._stau1 * s, line._C1pa)
+    sig12 = tau12 - (B12 - line._B11)
+    ssig12 = np.sin(sig12)
+    csig12 = np.cos(sig12)
+
+    ssig2 = line._ssig1 * csig12 + line._csig1 * ssig12
+    csig2 = line._csig1 * csig12 - line._ssig1 * ssig12
+    sbet2 = line._calp0 * ssig2
+    cbet2 = np.hypot(line._salp0, line._calp0 * csig2)
+    cbet2 = np.where(cbet2 == 0, _geodesic.Geodesic.tiny_, cbet2)
+
+    somg2 = line._salp0 * ssig2
+    E = math.copysign(1, line._salp0)
+    omg12 = E * (sig12
+                 - (np.arctan2(ssig2, csig2) - math.atan2(line._ssig1, line._csig1))
+                 + (np.arctan2(E * somg2, csig2) - math.atan2(E * line._somg1, line._comg1)))
+    lam12 = omg12 + line._A3c * (sig12 + (_sin_cos_series(ssig2, csig2, line._C3a) - line._B31))
+
+    latitudes = np.degrees(np.arctan2(sbet2, line._f1 * cbet2))
+    longitudes = (line.lon1 + np.degrees(lam12) + 180) % 360 - 180
+    return latitudes, longitudes
+
+
+def get_sample_distances(route_length, step_km):
+    """
+    * Method to get the distances of the samples taken after every step_km along a route
+    ***
+        :params route_length: length of the route in km
+        :params step_km: distance between two samples in km
+    * return distances array in km, starting step_km after the start and ending at route_length
+    """
+    if step_km <= 0:
+        raise ValueError("step_km must be positive")
+    # route_length once, also when it is a multiple of step_km
+    points_inbetween_coordinates = max(int(math.ceil(route_length / step_km)), 1)
+    return np.minimum(np.arange(1, points_inbetween_coordinates + 1) * step_km, route_length)
+
+
+def get_output_distances(route_length, step_km=10, max_points=None):
+    """
+    * Method to get the distances of the route points returned to the caller
+    ***
+        :params route_length: length of the route in km
+        :params step_km: distance between two returned points in km, None for no points
+        :params max_points: maximum number of returned points, when the step gives more (or step_km is None)
+                            max_points points evenly spaced from the start to the end are returned instead
+    * return distances array in km, see get_sample_distances
+    """
+    if step_km is None and max_points is None:
+        return np.zeros(0)
+    if max_points is not None:
+        if max_points < 1:
+            return np.zeros(0)
+        if not step_km or route_length / step_km > max_points:
+            return np.linspace(0, route_length, max_points)
+    return get_sample_distances(route_length, step_km)
+
+
+def get_route_samples(A, B, step_km=10, backend="ellipsoidal"):
+    """
+    * Method to get coordinates after every step_km along the geodesic from A to B
+    ***
+        :params A: start coordinate
+        :params B: end coordinate
+        :params step_km: distance between two samples in km
+        :params backend: "ellipsoidal" or "spherical", see GEOMETRY_BACKENDS
+    * return latitudes, longitudes and distances (in km from A) arrays
+
+    Samples start step_km after A and the last one is clipped to B.
+    """
+    line = get_route_line(A, B, backend)
+    distances = get_sample_distances(line.s13 / 1000, step_km)
+    latitudes, longitudes = get_line_positions(line, distances)
+    return latitudes, longitudes, distances
+
+
+class RouteGeometry(object):
+    """
+    * Departure time independent geometry of the route between two coordinates
+    ***
+        :params A: start coordinate
+        :params B: end coordinate
+        :params backend: "ellipsoidal" or "spherical", see GEOMETRY_BACKENDS
+
+    Holds the geodesic line, its length and the great circle distance, and caches the
+    positions of the sampled and returned route points so that every departure of the same
+    city pair reuses them. The cached arrays are read-only.
+    """
+
+    def __init__(self, A, B, backend="ellipsoidal"):
+        self.A = (A[0], A[1])
+        self.B = (B[0], B[1])
+        self.backend = backend
+        self.line = get_route_line(A, B, backend)
+        self.route_length = self.line.s13 / 1000
+        self.travel_distance = get_great_circle_distance(A, B)
+        self._points = {}
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return "<RouteGeometry %r->%r %.1fkm>" % (self.A, self.B, self.route_length)
+
+    def _get_points(self, key, get_distances):
+        points = self._points.get(key)
+        if points is None:
+            distances = get_distances()
+            latitudes, longitudes = get_line_positions(self.line, distances)
+            for array in (distances, latitudes, longitudes):
+                array.flags.writeable = False
+            points = distances, latitudes, longitudes
+            with self._lock:
+                self._points.setdefault(key, points)
+        return points
+
+    def get_sample_points(self, step_km):
+        """
+        * Method to get the points taken after every step_km, see get_sample_distances
+        * return distances (km), latitudes and longitudes arrays
+        """
+        return self._get_points(("sample", step_km), lambda: get_sample_distances(self.route_length, step_km))
+
+    def get_output_points(self, step_km=10, max_points=None):
+        """
+        * Method to get the points returned to the caller, see get_output_distances
+        * return distances (km), latitudes and longitudes arrays
+        """
+        if max_points is None and step_km is not None and step_km > 0:
+            # the same points as the samples of that step, which are often asked for as well; an invalid
+            # step goes on to get_output_distances, which rejects it
+            return self.get_sample_points(step_km)
+        return self._get_points(("output", step_km, max_points),
+                                lambda: get_output_distances(self.route_length, step_km, max_points))
+
+
+class RouteGeometryPool(object):
+    """
+    * Pool of RouteGeometry objects keyed by their endpoints
+    ***
+        :params max_entries: maximum number of routes kept, least recently used ones are dropped
+        :params backend: geometry backend of the routes, see GEOMETRY_BACKENDS
+    """
+
+    def __init__(self, max_entries=256, backend="ellipsoidal"):
+        self.max_entries = max_entries
+        self.backend = backend
+        self._geometries = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._geometries)
+
+    def get(self, A, B):
+        """
+        * Method to get the geometry of the route from A to B, creating it on first use
+        * return RouteGeometry
+        """
+        key = (float(A[0]), float(A[1]), float(B[0]), float(B[1]))
+        with self._lock:
+            geometry = self._geometries.get(key)
+            if geometry is not None:
+                self._geometries.move_to_end(key)
+                return geometry
+        geometry = RouteGeometry(A, B, self.backend)
+        with self._lock:
+            geometry = self._geometries.setdefault(key, geometry)
+            while len(self._geometries) > self.max_entries:
+                self._geometries.popitem(last=False)
+        return geometry
+
+    def clear(self):
+        with self._lock:
+            self._geometries.clear()
@@ -0,0 +1,146 @@
+"""
+    flight_route_plotter route result file
+"""
+import time
+from datetime import datetime, timezone
+
+from . _lazy import lazy_import
+
+np = lazy_import("numpy")
+
+__all__ = ["SunEvent", "RouteResult"]
+
+
+class SunEvent(object):
+    """
+    * Enroute sunrise or sunset
+    ***
+        kind : "sunrise" or "sunset"
+        lat : latitude at which the event occurred
+        lon : longitude at which the event occurred
+        timestamp : epoch seconds at which the event occurred
+    """
+    __slots__ = ("kind", "lat", "lon", "timestamp")
+
+    def __init__(self, kind, lat, lon, timestamp):
+        self.kind = kind
+        self.lat = lat
+        self.lon = lon
+        self.timestamp = timestamp
+
+    def __repr__(self):
+        return "SunEvent(%r, %r, %r, %r)" % (self.kind, self.lat, self.lon, self.timestamp)
+
+    @property
+    def datetime(self):
+        return datetime.fromtimestamp(self.timestamp, timezone.utc)
+
+    def to_dict(self):
+        """
+        * Method to convert the event into the point_sunrise_info/point_sunset_info dict format
+        """
+        return {
+            "enroute_sunrise_lat": self.lat,
+            "enroute_sunrise_long": self.lon,
+            "datetime_of_" + self.kind: self.datetime,
+            "sunrise_on_route": self.kind == "sunrise",
+            "sunset_on_route": self.kind == "sunset",
+        }
+
+
+class RouteResult(object):
+    """
+    * Flight route information backed by contiguous arrays
+    ***
+        start : "day" or "night" at departure
+        end : "day" or "night" at arrival
+        travel_distance : distance between source and destination in km
+        total_duration : flight duration in seconds
+        speed : average speed in nautical miles per hour
+        night_duration : night hours during the flight in HH:MM:SS, rounded to the minute and wrapping at 24 hours
+        latitudes, longitudes, altitudes : float64 arrays of the enroute points, altitude being the sun's in radians
+        epoch_ms : int64 array of the epoch milliseconds at which the flight reaches the enroute points
+        events : list of SunEvent in route order
+        moon_altitudes : float64 array of the moon's altitude in radians at the enroute points, NaN where it is
+                         day, None when the moon was not computed
+        moon_fractions : float64 array of the illuminated fraction of the moon at the enroute points, NaN where
+                         it is day, None when the moon was not computed
+        night_seconds : night time during the flight in seconds, unrounded, None when not given
+    """
+    __slots__ = ("start", "end", "travel_distance", "total_duration", "speed", "night_duration",
+                 "latitudes", "longitudes", "altitudes", "epoch_ms", "events", "moon_altitudes", "moon_fractions",
+                 "night_seconds")
+
+    def __init__(self, start, end, travel_distance, total_duration, speed, night_duration,
+                 latitudes, longitudes, altitudes, epoch_ms, events, moon_altitudes=None, moon_fractions=None,
+                 night_seconds=None):
+        self.start = start
+        self.end = end
+        self.travel_distance = travel_distance
+        self.total_duration = total_duration
+        self.speed = speed
+        self.night_duration = night_duration
+        self.night_seconds = night_seconds
+        self.latitudes = np.ascontiguousarray(latitudes, dtype=np.float64)
+        self.longitudes = np.ascontiguousarray(longitudes, dtype=np.float64)
+        self.altitudes = np.ascontiguousarray(altitudes, dtype=np.float64)
+        self.epoch_ms = np.ascontiguousarray(epoch_ms, dtype=np.int64)
+        self.events = events
+        self.moon_altitudes = None
+        self.moon_fractions = None
+        if moon_altitudes is not None:
+            self.moon_altitudes = np.ascontiguousarray(moon_altitudes, dtype=np.float64)
+            self.moon_fractions = np.ascontiguousarray(moon_fractions, dtype=np.float64)
+
+    def __len__(self):
+        return len(self.latitudes)
+
+    def __repr__(self):
+        return "<RouteResult %s->%s %.1fkm, %d points, %d events>" % (
+            self.start, self.end, self.travel_distance, len(self), len(self.events))
+
+    @property
+    def sunrise_events(self):
+        return [event for event in self.events if event.kind == "sunrise"]
+
+    @property
+    def sunset_events(self):
+        return [event for event in self.events if event.kind == "sunset"]
+
+    @property
+    def nbytes(self):
+        nbytes = self.latitudes.nbytes + self.longitudes.nbytes + self.altitudes.nbytes + self.epoch_ms.nbytes
+        if self.moon_altitudes is not None:
+            nbytes += self.moon_altitudes.nbytes + self.moon_fractions.nbytes
+        return nbytes
+
+    def enroute_coordinates(self):
+        """
+        * Method to get the enroute points as a list of {"lat", "long"} dicts, with "moon_altitude" (degrees)
+          and "moon_illumination" (None where it is day) when the moon was computed
+        """
+        coordinates = [{"lat": lat, "long": lon}
+                       for lat, lon in zip(self.latitudes.tolist(), self.longitudes.tolist())]
+        if self.moon_altitudes is not None:
+            days = np.isnan(self.moon_fractions).tolist()
+            for coordinate, moon_altitude, fraction, day in zip(coordinates, np.degrees(self.moon_altitudes).tolist(),
+                                                                 self.moon_fractions.tolist(), days):
+                coordinate["moon_altitude"] = None if day else moon_altitude
+                coordinate["moon_illumination"] = None if day else fraction
+        return coordinates
+
+    def to_dict(self):
+        """
+        * Method to convert the result into the get_flight_route_data dict format
+        """
+        return {
+            "start": self.start,
+            "end": self.end,
+            "travel_distance": self.travel_distance,
+            "total_duration": time.strftime('%H:%M:%S', time.gmtime(self.total_duration)),
+            "speed": self.speed,
+            "point_sunset_info": [event.to_dict() for event in self.sunset_events],
+            "point_sunrise_info": [event.to_dict() for event in self.sunrise_events],
+            "night_duration": self.night_duration,
+            "enroute_coordinates": self.enroute_coordinates(),
+        }
@@ -0,0 +1,228 @@
+"""
+    flight_route_plotter season calendar file
+"""
+from datetime import date, datetime, time, timedelta, timezone
+
+from . _lazy import lazy_import
+from . crossings import refine_crossings
+from . flight_locator import CROSSING_SEARCH_STEP_KM, _get_night_seconds, _timedelta_seconds, \
+    calculate_night_seconds, get_roundoff_time, get_sun_transitions
+from . route_geometry import RouteGeometry, get_line_positions
+from . route_result import RouteResult, SunEvent
+from . suncalc_v2 import getPositions
+
+np = lazy_import("numpy")
+
+__all__ = ["get_season_dates", "get_season_route_results", "get_season_route_data"]
+
+
+def _get_timezone(tz):
+    if tz is None:
+        return timezone.utc
+    if isinstance(tz, str):
+        from zoneinfo import ZoneInfo
+        return ZoneInfo(tz)
+    return tz
+
+
+def _get_departure_timestamp(day, departure_time, tz):
+    """
+    * Method to get the epoch seconds of a local departure time on a given day
+    """
+    departure = datetime.combine(day, departure_time)
+    # a pytz timezone gives the day's offset through localize only, replace would take its first one (LMT)
+    if hasattr(tz, "localize"):
+        return tz.localize(departure).timestamp()
+    return departure.replace(tzinfo=tz).timestamp()
+
+
+def _parse_clock(value):
+    """
+    * Method to read a time of day given as "HH:MM", "HH:MM:SS" or datetime.time
+    """
+    if isinstance(value, time):
+        return value
+    return time(*[int(part) for part in value.split(":")])
+
+
+def _parse_duration(value):
+    """
+    * Method to read a duration given in seconds, as "HH:MM" / "HH:MM:SS" or as timedelta
+    * return seconds
+    """
+    if isinstance(value, timedelta):
+        return int(value.total_seconds())
+    if isinstance(value, str):
+        parts = [int(part) for part in value.split(":")]
+        return sum(part * unit for part, unit in zip(parts, (3600, 60, 1)))
+    return int(value)
+
+
+def _parse_date(value):
+    if isinstance(value, date):
+        return value
+    return datetime.strptime(value, "%Y-%m-%d").date()
+
+
+def get_season_dates(first_date, last_date, weekdays=None):
+    """
+    * Method to list the operating days of a schedule
+    ***
+        :params first_date: first day, date or "YYYY-MM-DD"
+        :params last_date: last day (included), date or "YYYY-MM-DD"
+        :params weekdays: days of operation in the IATA notation, e.g. "1357" (1 is Monday), None for every day
+    * return list of dates
+    """
+    first_date, last_date = _parse_date(first_date), _parse_date(last_date)
+    days = [first_date + timedelta(days=n) for n in range((last_date - first_date).days + 1)]
+    if weekdays is None:
+        return days
+    weekdays = set(str(weekdays))
+    return [day for day in days if str(day.isoweekday()) in weekdays]
+
+
+def get_season_route_results(start_latitide, start_longitude, end_latitude, end_longitude, departure_time,
+                             duration, first_date, last_date, tz=None, weekdays=None, crossing_tolerance=1,
+                             sampling_step_km=None, output_step_km=None, max_points=None,
+                             geometry_backend="ellipsoidal"):
+    """
+    * Method to find sun's position during one scheduled flight on every day of a date range
+    ***
+        :params start_latitide : source's latitude
+        :params start_longitude : source's longitude
+        :params end_latitude : destination's latitude
+        :params end_longitude : destination's longitude
+        :params departure_time : local departure time of day, "HH:MM" or datetime.time
+        :params duration : block time, in seconds, "HH:MM" or timedelta
+        :params first_date : first day, date or "YYYY-MM-DD"
+        :params last_date : last day (included)
+        :params tz : timezone of departure_time, IANA name (read with zoneinfo), zoneinfo or pytz tzinfo,
+                     None for UTC
+        :params weekdays : days of operation in the IATA notation, e.g. "1357", None for every day
+        :params crossing_tolerance, sampling_step_km : as in get_flight_route_result, the tolerance defaulting
+                                                       to 1 second
+        :params output_step_km : spacing of the returned enroute coordinates, None (default) for none
+        :params max_points : maximum number of returned enroute coordinates
+        :params geometry_backend : "ellipsoidal" or "spherical", see route_geometry.GEOMETRY_BACKENDS
+    * return list of (date, RouteResult) in date order, each result being the one of get_flight_route_result
+
+    Every day shares the route geometry, so each stage runs once for the whole season on a
+    (days, points) array: the sun samples of all days are a single getPositions call, and the
+    sunrises/sunsets of all days are refined together, one vectorized evaluation per iteration.
+    """
+    tz = _get_timezone(tz)
+    departure_time = _parse_clock(departure_time)
+    duration = _parse_duration(duration)
+    days = get_season_dates(first_date, last_date, weekdays)
+    if not days:
+        return []
+
+    departures = np.array([_get_departure_timestamp(day, departure_time, tz) for day in days])
+    arrivals = departures + duration
+    total_duration = _timedelta_seconds(duration)
+
+    A = (start_latitide, start_longitude)
+    B = (end_latitude, end_longitude)
+    geometry = RouteGeometry(A, B, geometry_backend)
+    route_length = geometry.route_length
+    speed = geometry.travel_distance / (total_duration / 3600)
+
+    def get_seconds(distances):
+        return total_duration * distances / route_length if route_length else 0 * distances
+
+    def altitude_at(distances, day_indices):
+        latitudes, longitudes = get_line_positions(geometry.line, distances)
+        return getPositions(departures[day_indices] + get_seconds(distances), latitudes, longitudes)["altitude"]
+
+    # day/night at departure and arrival of every day
+    count = len(days)
+    terminal_altitudes = getPositions(np.concatenate([departures, arrivals]),
+                                      [A[0]] * count + [B[0]] * count, [A[1]] * count + [B[1]] * count)["altitude"]
+    starts = ["day" if altitude > 0 else "night" for altitude in terminal_altitudes[:count].tolist()]
+    ends = ["day" if altitude > 0 else "night" for altitude in terminal_altitudes[count:].tolist()]
+
+    # returned geopoints and their sun altitude, one row per day
+    distances, latitudes, longitudes = geometry.get_output_points(output_step_km, max_points)
+    reaching_seconds = get_seconds(distances)
+    altitudes = getPositions(departures[:, None] + reaching_seconds, latitudes, longitudes)["altitude"]
+
+    if sampling_step_km is None:
+        sampling_step_km = 10 if crossing_tolerance is None else CROSSING_SEARCH_STEP_KM
+    sample_distances, sample_latitudes, sample_longitudes = geometry.get_sample_points(sampling_step_km)
+    if np.array_equal(sample_distances, distances):
+        sample_altitudes = altitudes
+    else:
+        sample_altitudes = getPositions(departures[:, None] + get_seconds(sample_distances), sample_latitudes,
+                                        sample_longitudes)["altitude"]
+
+    # (day, sample index, kind) of every sunrise/sunset of the season
+    transitions = [(day_index, index, kind) for day_index in range(count)
+                   for index, kind in get_sun_transitions(sample_altitudes[day_index], starts[day_index])]
+    event_days = np.array([transition[0] for transition in transitions], dtype=np.intp)
+    event_samples = np.array([transition[1] for transition in transitions], dtype=np.intp)
+    event_distances = sample_distances[event_samples] if transitions else np.zeros(0)
+    event_latitudes = sample_latitudes[event_samples] if transitions else np.zeros(0)
+    event_longitudes = sample_longitudes[event_samples] if transitions else np.zeros(0)
+
+    if crossing_tolerance is not None and transitions:
+        xtol = crossing_tolerance * route_length / total_duration if total_duration else route_length
+        lo = np.where(event_samples > 0, sample_distances[np.maximum(event_samples - 1, 0)], 0.0)
+        f_lo = altitude_at(lo, event_days)
+        f_hi = sample_altitudes[event_days, event_samples]
+        bracketed = np.flatnonzero(f_lo * f_hi <= 0)
+        if bracketed.size:
+            roots = refine_crossings(lambda x, index: altitude_at(x, event_days[bracketed[index]]),
+                                     lo[bracketed], event_distances[bracketed], f_lo[bracketed],
+                                     f_hi[bracketed], xtol)
+            root_latitudes, root_longitudes = get_line_positions(geometry.line, roots)
+            event_distances = event_distances.copy()
+            event_latitudes = event_latitudes.copy()
+            event_longitudes = event_longitudes.copy()
+            event_distances[bracketed] = roots
+            event_latitudes[bracketed] = root_latitudes
+            event_longitudes[bracketed] = root_longitudes
+    event_timestamps = departures[event_days] + get_seconds(event_distances)
+
+    events = [[] for _ in range(count)]
+    for (day_index, _, kind), lat, lon, timestamp in zip(transitions, event_latitudes.tolist(),
+                                                          event_longitudes.tolist(), event_timestamps.tolist()):
+        events[day_index].append(SunEvent(kind, lat, lon, timestamp))
+
+    epoch_ms = np.rint((departures[:, None] + reaching_seconds) * 1000)
+    results = []
+    for day_index, day in enumerate(days):
+        day_events = events[day_index]
+        travel_info = {"start": starts[day_index], "end": ends[day_index], "total_duration": total_duration}
+        departure, arrival = float(departures[day_index]), float(arrivals[day_index])
+        night_seconds = calculate_night_seconds(
+            [event.timestamp for event in day_events if event.kind == "sunset"],
+            [event.timestamp for event in day_events if event.kind == "sunrise"],
+            travel_info, departure, arrival)
+        results.append((day, RouteResult(starts[day_index], ends[day_index], geometry.travel_distance,
+                                          total_duration, speed/1.852, get_roundoff_time(night_seconds),
+                                          latitudes, longitudes, altitudes[day_index], epoch_ms[day_index],
+                                          day_events, night_seconds=_get_night_seconds(starts[day_index], day_events,
+                                                                                       departure, arrival))))
+    return results
+
+
+def get_season_route_data(start_latitide, start_longitude, end_latitude, end_longitude, departure_time, duration,
+                          first_date, last_date, tz=None, weekdays=None, crossing_tolerance=1,
+                          sampling_step_km=None, output_step_km=None, max_points=None,
+                          geometry_backend="ellipsoidal"):
+    """
+    * Method to find sun's position during one scheduled flight on every day of a date range
+    ***
+        :params see get_season_route_results
+    * return list of get_flight_route_data dicts in date order, each with the departure "date" added
+    """
+    season = get_season_route_results(start_latitide, start_longitude, end_latitude, end_longitude,
+                                      departure_time, duration, first_date, last_date, tz, weekdays,
+                                      crossing_tolerance, sampling_step_km, output_step_km, max_points,
+                                      geometry_backend)
+    data = []
+    for day, result in season:
+        day_data = result.to_dict()
+        day_data["date"] = day
+        data.append(day_data)
+    return data
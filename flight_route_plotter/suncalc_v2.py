@@ -6,6 +6,12 @@ from datetime import datetime, timedelta
 import time
 import calendar
 
+from ._lazy import lazy_import
+from .profiling import timed_stage
+
+np = lazy_import("numpy")
+_kernels = lazy_import("flight_route_plotter.kernels")
+
 PI = 3.141592653589793  # math.pi
 sin = math.sin
 cos = math.cos
@@ -51,12 +57,13 @@ def siderealTime(d, lw):
     return rad * (280.16 + 360.9856235 * d) - lw
 
 
+# naive datetimes are taken as UTC, so results do not depend on the host's timezone
 def toJulian(date):
-    return (time.mktime(date.timetuple()) * 1000) / dayMs - 0.5 + J1970
+    return (calendar.timegm(date.utctimetuple()) * 1000) / dayMs - 0.5 + J1970
 
 
 def fromJulian(j):
-    return datetime.fromtimestamp(((j + 0.5 - J1970) * dayMs) / 1000.0)
+    return datetime(1970, 1, 1) + timedelta(milliseconds=(j + 0.5 - J1970) * dayMs)
 
 
 def toDays(date):
@@ -180,47 +187,10 @@ def getMoonTimes(date, lat, lng):
     t = date.replace(hour=0, minute=0, second=0)
 
     hc = 0.133 * rad
-    pos = getMoonPosition(t, lat, lng)
-    h0 = pos["altitude"] - hc
-    rise = 0
-    sett = 0
-    # go in 2-hour chunks, each time seeing if a 3-point quadratic curve crosses zero (which means rise or set)
-    for i in range(1, 24, 2):
-        h1 = getMoonPosition(hoursLater(t, i), lat, lng)["altitude"] - hc
-        h2 = getMoonPosition(hoursLater(t, i + 1), lat, lng)["altitude"] - hc
-
-        a = (h0 + h2) / 2 - h1
-        b = (h2 - h0) / 2
-        xe = -b / (2 * a)
-        ye = (a * xe + b) * xe + h1
-        d = b * b - 4 * a * h1
-        roots = 0
-
-        if d >= 0:
-            dx = math.sqrt(d) / (abs(a) * 2)
-            x1 = xe - dx
-            x2 = xe + dx
-            if abs(x1) <= 1:
-                roots += 1
-            if abs(x2) <= 1:
-                roots += 1
-            if x1 < -1:
-                x1 = x2
-
-        if roots == 1:
-            if h0 < 0:
-                rise = i + x1
-            else:
-                sett = i + x1
-
-        elif roots == 2:
-            rise = i + (x2 if ye < 0 else x1)
-            sett = i + (x1 if ye < 0 else x2)
-
-        if (rise and sett):
-            break
-
-        h0 = h2
+    # moon's altitude at every hour of the day in a single batch call
+    start = calendar.timegm(t.utctimetuple())
+    h = getMoonPositions(start + 3600 * np.arange(25), lat, lng)["altitude"] - hc
+    rise, sett, ye = _kernels.moon_rise_set(h)
 
     result = dict()
 
@@ -259,3 +229,102 @@ def getPosition(date, lat, lng):
     c = sunCoords(d)
     H = siderealTime(d, lw) - c["ra"]
     return dict(azimuth=azimuth(H, phi, c["dec"]), altitude=altitude(H, phi, c["dec"]))
+
+
+# batch versions operating on numpy arrays of epoch seconds, latitudes and longitudes
+
+def toDaysFromTimestamps(timestamps):
+    return np.asarray(timestamps, dtype=float) / (dayMs / 1000) - 0.5 + J1970 - J2000
+
+
+def sunCoordsArray(d):
+    M = rad * (357.5291 + 0.98560028 * d)
+    C = rad * (1.9148 * np.sin(M) + 0.02 * np.sin(2 * M) + 0.0003 * np.sin(3 * M))
+    L = M + C + rad * 102.9372 + PI
+    sinL = np.sin(L)
+    return dict(dec=np.arcsin(sinL * sin(e)), ra=np.arctan2(sinL * cos(e), np.cos(L)))
+
+
+# optional ephemeris.EphemerisTable replacing sunCoordsArray in getPositions
+_ephemeris = None
+
+
+def setEphemeris(table):
+    global _ephemeris
+    _ephemeris = table
+
+
+@timed_stage("solar", lambda args, result: result["altitude"].size)
+def getPositions(timestamps, lats, lngs):
+    lw = rad * -np.asarray(lngs, dtype=float)
+    phi = rad * np.asarray(lats, dtype=float)
+    d = toDaysFromTimestamps(timestamps)
+
+    table = _ephemeris
+    if table is not None and table.covers(d):
+        c = table.lookup(d)
+        H = c["gha"] - lw
+    else:
+        if _kernels.is_jit_enabled():
+            positions = _kernels.sun_positions(d, lw, phi, rad, e)
+            if positions is not None:
+                return positions
+        c = sunCoordsArray(d)
+        H = rad * (280.16 + 360.9856235 * d) - lw - c["ra"]
+    sinPhi, cosPhi = np.sin(phi), np.cos(phi)
+    sinDec, cosDec = np.sin(c["dec"]), np.cos(c["dec"])
+    cosH = np.cos(H)
+    return dict(azimuth=np.arctan2(np.sin(H), cosH * sinPhi - sinDec / cosDec * cosPhi),
+                altitude=np.arcsin(sinPhi * sinDec + cosPhi * cosDec * cosH))
+
+
+def moonCoordsArray(d):
+    L = rad * (218.316 + 13.176396 * d)
+    M = rad * (134.963 + 13.064993 * d)
+    F = rad * (93.272 + 13.229350 * d)
+
+    l = L + rad * 6.289 * np.sin(M)
+    b = rad * 5.128 * np.sin(F)
+    dt = 385001 - 20905 * np.cos(M)
+
+    sinL, sinB, cosB = np.sin(l), np.sin(b), np.cos(b)
+    return dict(ra=np.arctan2(sinL * cos(e) - sinB / cosB * sin(e), np.cos(l)),
+                dec=np.arcsin(sinB * cos(e) + cosB * sin(e) * sinL), dist=dt)
+
+
+@timed_stage("lunar", lambda args, result: result["altitude"].size)
+def getMoonPositions(timestamps, lats, lngs):
+    lw = rad * -np.asarray(lngs, dtype=float)
+    phi = rad * np.asarray(lats, dtype=float)
+    d = toDaysFromTimestamps(timestamps)
+
+    c = moonCoordsArray(d)
+    H = rad * (280.16 + 360.9856235 * d) - lw - c["ra"]
+    sinPhi, cosPhi = np.sin(phi), np.cos(phi)
+    sinDec, cosDec = np.sin(c["dec"]), np.cos(c["dec"])
+    cosH = np.cos(H)
+    h = np.arcsin(sinPhi * sinDec + cosPhi * cosDec * cosH)
+
+    # altitude correction for refraction
+    h = h + rad * 0.017 / np.tan(h + rad * 10.26 / (h + rad * 5.10))
+
+    return dict(azimuth=np.arctan2(np.sin(H), cosH * sinPhi - sinDec / cosDec * cosPhi), altitude=h,
+                distance=c["dist"])
+
+
+def getMoonIlluminations(timestamps):
+    d = toDaysFromTimestamps(timestamps)
+    s = sunCoordsArray(d)
+    m = moonCoordsArray(d)
+
+    # distance from Earth to Sun in km
+    sdist = 149598000
+    sinSDec, cosSDec = np.sin(s["dec"]), np.cos(s["dec"])
+    sinMDec, cosMDec = np.sin(m["dec"]), np.cos(m["dec"])
+    cosDRa = np.cos(s["ra"] - m["ra"])
+    phi = np.arccos(np.clip(sinSDec * sinMDec + cosSDec * cosMDec * cosDRa, -1, 1))
+    inc = np.arctan2(sdist * np.sin(phi), m["dist"] - sdist * np.cos(phi))
+    angle = np.arctan2(cosSDec * np.sin(s["ra"] - m["ra"]), sinSDec * cosMDec - cosSDec * sinMDec * cosDRa)
+
+    return dict(fraction=(1 + np.cos(inc)) / 2, phase=0.5 + 0.5 * inc * np.where(angle < 0, -1, 1) / PI,
+                angle=angle)
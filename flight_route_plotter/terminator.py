@@ -0,0 +1,196 @@
+"""
+    flight_route_plotter analytic terminator crossing file
+
+    At a given instant the points where the sun is at altitude h form a small circle
+    p . n = sin(h) around the subsolar direction n, and a great circle route is
+    p(x) = cos(x S) a + sin(x S) u. Their intersections are in closed form:
+
+        p(x) . n = R cos(x S - phi) = sin(h),  R = hypot(a . n, u . n),  phi = atan2(u . n, a . n)
+
+    The terminator moves while the aircraft flies, so the closed form is solved with n frozen
+    at every half hour of flight: a crossing lies where the frozen root passes the aircraft's own
+    position, which gives the seeds. They are polished with Newton steps on the exact
+    altitude along the WGS84 geodesic, the slope coming from the spherical model.
+"""
+import math
+
+from . _lazy import lazy_import
+from . crossings import get_route_altitude_function, refine_crossings
+from . suncalc_v2 import rad, sunCoordsArray, times, toDaysFromTimestamps
+
+np = lazy_import("numpy")
+
+__all__ = ["SUNRISE_ALTITUDE", "get_terminator_crossings"]
+
+# sun's altitude in degrees at sunrise/sunset as used by getTimes (refraction and sun's radius)
+SUNRISE_ALTITUDE = times[0][0]
+
+# flight time in seconds and route arc in degrees between two instants at which the terminator is taken
+# as fixed when seeding the crossings
+SEGMENT_SECONDS = 1800
+SEGMENT_ARC = 10
+MAX_NEWTON_STEPS = 8
+
+# rate of change of the subsolar longitude, radians per second
+_SUBSOLAR_LONGITUDE_RATE = -2 * math.pi / 86400
+
+
+def _get_unit_vector(lat, lon):
+    lat, lon = rad * lat, rad * lon
+    return np.array([math.cos(lat) * math.cos(lon), math.cos(lat) * math.sin(lon), math.sin(lat)])
+
+
+def _get_subsolar_vectors(timestamps):
+    """
+    * Method to get the unit vectors pointing to the sun in the earth fixed frame
+    ***
+        :params timestamps: array of epoch seconds
+    * return array of shape (3, n) and array of subsolar longitudes in radians
+    """
+    d = toDaysFromTimestamps(timestamps)
+    c = sunCoordsArray(d)
+    longitude = c["ra"] - rad * (280.16 + 360.9856235 * d)
+    cos_dec = np.cos(c["dec"])
+    return np.array([cos_dec * np.cos(longitude), cos_dec * np.sin(longitude), np.sin(c["dec"])]), longitude
+
+
+def get_terminator_crossings(geometry, start_timestamp, total_duration, altitude=0.0, tolerance=1.0,
+                             altitude_at=None):
+    """
+    * Method to find where a flight crosses the line on which the sun is at a given altitude
+    ***
+        :params geometry: RouteGeometry of the route
+        :params start_timestamp: departure time as epoch seconds
+        :params total_duration: flight duration in seconds
+        :params altitude: sun's altitude of the crossings in degrees, 0 or SUNRISE_ALTITUDE (-0.833)
+        :params tolerance: precision of the crossing times in seconds
+        :params altitude_at: route altitude function from get_route_altitude_function, built when None
+    * return list of (distance_km, direction) in route order, direction is 1 when the sun rises above
+             altitude (sunrise) and -1 when it sets below it (sunset)
+
+    The work does not depend on the route length: a couple of seeds per half hour of flight and a
+    handful of vectorized evaluations of the sun's altitude. A route grazing the terminator, with
+    two crossings a few km apart, can still be missed, as with sampling.
+    """
+    route_length = geometry.route_length
+    arc = rad * geometry.line.a13
+    if route_length <= 0 or total_duration <= 0 or arc <= 0:
+        return []
+    if altitude_at is None:
+        altitude_at = get_route_altitude_function(geometry.line, start_timestamp, total_duration)
+    threshold = rad * altitude
+    sin_threshold = math.sin(threshold)
+    xtol = tolerance * route_length / total_duration
+    delta = max(4 * xtol, 1e-3)
+
+    # the route as a great circle leaving A with the geodesic's initial azimuth
+    a = _get_unit_vector(*geometry.A)
+    lat, lon, azimuth = rad * geometry.A[0], rad * geometry.A[1], rad * geometry.line.azi1
+    east = np.array([-math.sin(lon), math.cos(lon), 0.0])
+    north = np.array([-math.sin(lat) * math.cos(lon), -math.sin(lat) * math.sin(lon), math.cos(lat)])
+    u = math.sin(azimuth) * east + math.cos(azimuth) * north
+
+    def solve(x, n, branch):
+        # closed form root of cos(x S) a.n + sin(x S) u.n = sin(h) on the given branch, nearest to x,
+        # and whether the terminator reaches the route's great circle at all
+        an, un = a.dot(n), u.dot(n)
+        r = np.hypot(an, un)
+        valid = r > abs(sin_threshold)
+        angle = np.arctan2(un, an) + branch * np.arccos(np.clip(sin_threshold / np.where(valid, r, 1.0), -1, 1))
+        angle = x * arc + (angle - x * arc + math.pi) % (2 * math.pi) - math.pi
+        return angle / arc, valid
+
+    def model(x, n=None):
+        # sin of the sun's altitude on the spherical route and its derivative with respect to x
+        if n is None:
+            n, _ = _get_subsolar_vectors(start_timestamp + x * total_duration)
+        cos_x, sin_x = np.cos(x * arc), np.sin(x * arc)
+        p = np.outer(a, cos_x) + np.outer(u, sin_x)
+        dp = arc * (np.outer(u, cos_x) - np.outer(a, sin_x))
+        dn = _SUBSOLAR_LONGITUDE_RATE * total_duration * np.array([-n[1], n[0], np.zeros_like(x)])
+        return np.clip((p * n).sum(axis=0), -1, 1), (dp * n).sum(axis=0) + (p * dn).sum(axis=0)
+
+    # seeds: with the terminator frozen at instants a segment apart, the closed form root of each
+    # branch minus the aircraft's own position changes sign around a crossing
+    segments = max(2, int(math.ceil(total_duration / float(SEGMENT_SECONDS))),
+                   int(math.ceil(arc / (rad * SEGMENT_ARC))))
+    nodes = np.arange(segments + 1) / float(segments)
+    n, _ = _get_subsolar_vectors(start_timestamp + nodes * total_duration)
+    seeds = []
+    for branch in (1, -1):
+        roots, valid = solve(nodes, n, branch)
+        lead = roots - nodes
+        # pairs of nodes around a sign change, a jump of a whole turn is not one
+        bracket = valid[:-1] & valid[1:] & ((lead[:-1] > 0) != (lead[1:] > 0)) & \
+            (np.abs(lead[1:] - lead[:-1]) < math.pi / arc)
+        i = np.flatnonzero(bracket)
+        seeds.append(nodes[i] - lead[i] * (nodes[i + 1] - nodes[i]) / (lead[i + 1] - lead[i]))
+
+    # where the route runs along the terminator the two branches swap over, so the sign changes of
+    # the moving spherical model between nodes are seeds too
+    g, slope = model(nodes, n)
+    i = np.flatnonzero((g[:-1] > sin_threshold) != (g[1:] > sin_threshold))
+    seeds.append(nodes[i] + (sin_threshold - g[i]) * (nodes[i + 1] - nodes[i]) / (g[i + 1] - g[i]))
+
+    # two close crossings around an extremum of the altitude can fall between two nodes, e.g. when the
+    # route grazes the terminator: seed both sides of an extremum that goes past the threshold
+    i = np.flatnonzero((slope[:-1] > 0) != (slope[1:] > 0))
+    if i.size:
+        extremums = nodes[i] - slope[i] * (nodes[i + 1] - nodes[i]) / (slope[i + 1] - slope[i])
+        g_extremum, _ = model(extremums)
+        past = (g_extremum > sin_threshold) != (g[i] > sin_threshold)
+        i, extremums = i[past], extremums[past]
+        seeds.extend([(nodes[i] + extremums) / 2, (extremums + nodes[i + 1]) / 2])
+
+    x = np.concatenate(seeds)
+    crossings = []
+    candidates = np.zeros(0)
+    if x.size:
+        # Newton steps on the exact altitude, the slope from the spherical model
+        distances = np.clip(x * route_length, 0, route_length)
+        converged = np.zeros(distances.shape, dtype=bool)
+        for _ in range(MAX_NEWTON_STEPS):
+            f = altitude_at(distances) - threshold
+            g, slope = model(distances / route_length)
+            slope = slope / np.sqrt(np.maximum(1 - g * g, 1e-12)) / route_length
+            usable = np.abs(slope) > 1e-12
+            step = np.where(usable, f / np.where(usable, slope, 1.0), 0.0)
+            previous, distances = distances, np.clip(distances - step, 0, route_length)
+            # a root beyond an end of the route stops there, and is then dropped as no sign change
+            converged = usable & (np.abs(distances - previous) <= xtol)
+            if converged.all():
+                break
+        candidates = distances
+        distances = np.sort(distances[converged])
+        if distances.size:
+            # seeds of neighbouring segments converge to the same crossings
+            distances = distances[np.concatenate([[True], np.diff(distances) > 4 * xtol])]
+
+            # keep the actual sign changes, tangent points are not crossings
+            f_before, f_after = np.split(altitude_at(np.clip(np.concatenate([distances - delta, distances + delta]),
+                                                             0, route_length)) - threshold, 2)
+            crossings = [(distance, 1 if after > 0 else -1)
+                         for distance, before, after in zip(distances.tolist(), f_before.tolist(), f_after.tolist())
+                         if (before > 0) != (after > 0)]
+
+    # the crossings have to alternate from the departure's day/night state to the arrival's, which fails
+    # when Newton stops at an end of the route for a crossing seconds away from it
+    f_ends = altitude_at(np.array([0.0, route_length])) - threshold
+    day = f_ends[0] > 0
+    for _, direction in crossings:
+        if (direction > 0) == day:
+            break
+        day = direction > 0
+    else:
+        if day == (f_ends[1] > 0):
+            return crossings
+
+    # otherwise bracket the sign changes between the nodes, the Newton roots and their neighbours, and
+    # refine them: the sequence then goes from the departure's state to the arrival's by construction
+    grid = np.unique(np.clip(np.concatenate([nodes * route_length, candidates, candidates - delta,
+                                             candidates + delta]), 0, route_length))
+    f = altitude_at(grid) - threshold
+    i = np.flatnonzero((f[:-1] > 0) != (f[1:] > 0))
+    roots = refine_crossings(lambda distance, index: altitude_at(distance) - threshold, grid[i], grid[i + 1],
+                             f[i], f[i + 1], xtol)
+    return [(distance, 1 if after > 0 else -1) for distance, after in zip(roots.tolist(), f[i + 1].tolist())]
@@ -0,0 +1,193 @@
+"""
+    flight_route_plotter recorded track file
+
+    Day/night segmentation of flown tracks, e.g. ADS-B positions, given as arrays of
+    timestamps, latitudes and longitudes sorted by flight and time:
+
+        track = open_track("2019-02-07.npy")
+        for flight in iter_track_results(*track, crossing_tolerance=1):
+            print(flight["flight_id"], flight["night_duration"], len(flight["events"]))
+"""
+import math
+from datetime import datetime, timezone
+
+from . _lazy import lazy_import
+from . crossings import refine_crossings
+from . flight_locator import _format_duration
+from . suncalc_v2 import getPositions
+
+np = lazy_import("numpy")
+
+__all__ = ["TRACK_CHUNK_SIZE", "open_track", "iter_track_results", "get_track_results"]
+
+# number of track points read and computed at once
+TRACK_CHUNK_SIZE = 65536
+
+# field names of a structured track array, the first one present is used
+_TRACK_FIELDS = (
+    ("timestamp", "timestamps", "time"),
+    ("lat", "latitude", "latitudes"),
+    ("lon", "long", "longitude", "longitudes"),
+    ("flight_id", "flight", "icao24", "callsign"),
+)
+
+
+def open_track(path):
+    """
+    * Method to memory-map a track saved with numpy.save
+    ***
+        :params path: .npy file of a structured array with timestamp, lat, lon and optionally flight_id fields
+                      (see _TRACK_FIELDS for the accepted names), or of a (n, 3) or (n, 4) array with the
+                      columns timestamp, lat, lon and flight id
+    * return (timestamps, latitudes, longitudes, flight_ids) views of the file, flight_ids being None when absent
+    """
+    track = np.load(path, mmap_mode="r")
+    if track.dtype.names is None:
+        if track.ndim != 2 or track.shape[1] not in (3, 4):
+            raise ValueError("track must be a structured array or have 3 or 4 columns, got shape %r"
+                             % (track.shape,))
+        return track[:, 0], track[:, 1], track[:, 2], track[:, 3] if track.shape[1] == 4 else None
+    columns = []
+    for names in _TRACK_FIELDS:
+        name = next((name for name in names if name in track.dtype.names), None)
+        if name is None and names is not _TRACK_FIELDS[-1]:
+            raise KeyError("track has no %s field" % names[0])
+        columns.append(None if name is None else track[name])
+    return tuple(columns)
+
+
+def _new_flight(flight_id, timestamp, state):
+    return {"flight_id": flight_id, "start": state, "start_timestamp": timestamp, "points": 0, "events": [],
+            "night_seconds": 0.0, "_night": state == "night", "_since": timestamp}
+
+
+def _add_event(flight, kind, lat, lon, timestamp):
+    if flight["_night"]:
+        flight["night_seconds"] += timestamp - flight["_since"]
+    flight["_night"], flight["_since"] = kind == "sunset", timestamp
+    flight["events"].append({"type": kind, "lat": lat, "long": lon, "timestamp": timestamp,
+                             "datetime": datetime.fromtimestamp(timestamp, timezone.utc)})
+
+
+def _end_flight(flight, timestamp, state):
+    if flight["_night"]:
+        flight["night_seconds"] += timestamp - flight["_since"]
+    del flight["_night"], flight["_since"]
+    flight["end"] = state
+    flight["end_timestamp"] = timestamp
+    flight["night_duration"] = _format_duration(60 * round(flight["night_seconds"] / 60))
+    return flight
+
+
+def iter_track_results(timestamps, latitudes, longitudes, flight_ids=None, chunk_size=TRACK_CHUNK_SIZE,
+                       crossing_tolerance=None, horizon_altitude=0):
+    """
+    * Generator segmenting recorded tracks into day and night
+    ***
+        :params timestamps: epoch seconds of the track points, sorted within every flight
+        :params latitudes: latitudes of the track points
+        :params longitudes: longitudes of the track points
+        :params flight_ids: flight of every point, the points of a flight being contiguous, None when all
+                            the points are one flight; any sliceable array works, numpy memmaps included
+        :params chunk_size: number of points read and computed at once
+        :params crossing_tolerance: precision of sunrise/sunset times in seconds, when given each crossing
+                                    is refined between the two track points around it (moving linearly
+                                    between them), otherwise it is reported at the first point past it
+        :params horizon_altitude: sun's altitude in degrees separating day from night
+    * yield one dict per flight, in track order, with flight_id, start and end ("day"/"night"),
+            start_timestamp, end_timestamp, points, events (sunrise/sunset dicts with type, lat, long,
+            timestamp and datetime), night_seconds and night_duration
+
+    This is the process_positional_data state machine run on whole chunks: a flight changes
+    from day to night when the sun goes below horizon_altitude and back when it goes above it.
+    The state, the open flight and the last point are carried from one chunk to the next, so
+    memory is bounded by chunk_size whatever the track's length.
+    """
+    threshold = math.radians(horizon_altitude)
+    count = len(timestamps)
+    flight = None
+    # last point of the previous chunk: state (1 day, -1 night), flight id, timestamp, lat, lon, altitude
+    carry = None
+    for chunk_start in range(0, count, chunk_size):
+        chunk_end = min(chunk_start + chunk_size, count)
+        times = np.asarray(timestamps[chunk_start:chunk_end], dtype=float)
+        lats = np.asarray(latitudes[chunk_start:chunk_end], dtype=float)
+        lons = np.asarray(longitudes[chunk_start:chunk_end], dtype=float)
+        ids = None if flight_ids is None else np.asarray(flight_ids[chunk_start:chunk_end])
+        altitudes = getPositions(times, lats, lons)["altitude"] - threshold
+        size = len(times)
+
+        # first point of every flight
+        new = np.zeros(size, dtype=bool)
+        if ids is not None:
+            new[1:] = ids[1:] != ids[:-1]
+        new[0] = carry is None or (ids is not None and ids[0] != carry[1])
+
+        # state machine: a point above the threshold makes it day, below it night, on it keeps the state;
+        # a flight starts in the day only with the sun above the threshold
+        forcing = np.where(new, np.where(altitudes > 0, 1, -1), np.sign(altitudes)).astype(np.int8)
+        forcing = np.concatenate([[0 if carry is None else carry[0]], forcing])
+        last_set = np.maximum.accumulate(np.where(forcing != 0, np.arange(size + 1), 0))
+        states = forcing[last_set]
+        changes = np.flatnonzero((states[1:] != states[:-1]) & ~new)
+
+        # track point before every change
+        previous_times = np.concatenate([[carry[2] if carry else times[0]], times[:-1]])[changes]
+        previous_lats = np.concatenate([[carry[3] if carry else lats[0]], lats[:-1]])[changes]
+        previous_lons = np.concatenate([[carry[4] if carry else lons[0]], lons[:-1]])[changes]
+        previous_altitudes = np.concatenate([[carry[5] if carry else altitudes[0]], altitudes[:-1]])[changes]
+        event_times, event_lats, event_lons = times[changes], lats[changes], lons[changes]
+        if crossing_tolerance is not None and changes.size:
+            spans = event_times - previous_times
+            delta_lats = event_lats - previous_lats
+            delta_lons = (event_lons - previous_lons + 180) % 360 - 180
+
+            def get_position(seconds, index):
+                fraction = seconds / np.where(spans[index] > 0, spans[index], 1.0)
+                return (previous_lats[index] + fraction * delta_lats[index],
+                        (previous_lons[index] + fraction * delta_lons[index] + 180) % 360 - 180)
+
+            def altitude_at(seconds, index):
+                lat, lon = get_position(seconds, index)
+                return getPositions(previous_times[index] + seconds, lat, lon)["altitude"] - threshold
+
+            indices = np.arange(changes.size)
+            seconds = refine_crossings(altitude_at, np.zeros(changes.size), spans, previous_altitudes,
+                                       altitudes[changes], crossing_tolerance)
+            event_lats, event_lons = get_position(seconds, indices)
+            event_times = previous_times + seconds
+
+        # walk through the chunk's pieces of flights in track order, the first one going on from the
+        # previous chunk unless a flight starts on the chunk's first point
+        states = states[1:]
+        starts = np.flatnonzero(new).tolist()
+        bounds = ([] if starts and starts[0] == 0 else [0]) + starts + [size]
+        event = 0
+        for begin, end in zip(bounds[:-1], bounds[1:]):
+            if new[begin]:
+                if flight is not None:
+                    yield _end_flight(flight, carry[2], "day" if carry[0] > 0 else "night")
+                flight = _new_flight(None if ids is None else ids[begin].item(), float(times[begin]),
+                                     "day" if states[begin] > 0 else "night")
+            flight["points"] += end - begin
+            while event < changes.size and changes[event] < end:
+                _add_event(flight, "sunrise" if states[changes[event]] > 0 else "sunset",
+                           float(event_lats[event]), float(event_lons[event]), float(event_times[event]))
+                event += 1
+            carry = (int(states[end - 1]), None if ids is None else ids[end - 1], float(times[end - 1]),
+                     float(lats[end - 1]), float(lons[end - 1]), float(altitudes[end - 1]))
+
+    if flight is not None:
+        yield _end_flight(flight, carry[2], "day" if carry[0] > 0 else "night")
+
+
+def get_track_results(timestamps, latitudes, longitudes, flight_ids=None, chunk_size=TRACK_CHUNK_SIZE,
+                      crossing_tolerance=None, horizon_altitude=0):
+    """
+    * Method to segment recorded tracks into day and night
+    ***
+        :params see iter_track_results
+    * return list of the per flight dicts of iter_track_results
+    """
+    return list(iter_track_results(timestamps, latitudes, longitudes, flight_ids, chunk_size, crossing_tolerance,
+                                   horizon_altitude))
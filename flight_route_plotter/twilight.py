@@ -0,0 +1,129 @@
+"""
+    flight_route_plotter twilight crossing file
+"""
+from datetime import datetime, timezone
+
+from . _lazy import lazy_import
+from . crossings import get_route_altitude_function, refine_crossings
+from . flight_locator import CROSSING_SEARCH_STEP_KM, _timedelta_seconds, parse_timestamp
+from . route_geometry import RouteGeometry, get_line_positions
+from . suncalc_v2 import getPositions, rad, times
+
+np = lazy_import("numpy")
+
+__all__ = ["PHASE_NAMES", "get_twilight_data"]
+
+# names of the altitude bands of suncalc_v2.times, keyed by (lower, upper) altitude in degrees, None for no bound
+PHASE_NAMES = {
+    (6, None): "day",
+    (-0.3, 6): "golden_hour",
+    (-0.833, -0.3): "horizon",
+    (-6, -0.833): "civil_twilight",
+    (-12, -6): "nautical_twilight",
+    (-18, -12): "astronomical_twilight",
+    (None, -18): "night",
+}
+
+
+def _get_phase_name(lower, upper):
+    name = PHASE_NAMES.get((lower, upper))
+    if name is None:
+        name = "%s..%s" % ("" if lower is None else "%g" % lower, "" if upper is None else "%g" % upper)
+    return name
+
+
+def get_twilight_data(start_latitide, start_longitude, start_datetime, end_latitude, end_longitude, end_datetime,
+                      thresholds=None, crossing_tolerance=1, sampling_step_km=None, geometry=None,
+                      geometry_backend="ellipsoidal"):
+    """
+    * Method to find where the sun crosses several altitudes during a flight, in one pass
+    ***
+        :params start_latitide : source's latitude
+        :params start_longitude : source's longitude
+        :params start_datetime : flight's departure time
+        :params end_latitude : destination's latitude
+        :params end_longitude : destination's longitude
+        :params end_datetime : flight's arrival time
+        :params thresholds : list of [altitude in degrees, rising name, setting name], suncalc_v2.times by default
+                             (sunrise, sunriseEnd, dawn, nauticalDawn, nightEnd and goldenHourEnd)
+        :params crossing_tolerance : precision of the crossing times in seconds, None to report crossings at the
+                                     first sample past them
+        :params sampling_step_km : spacing of the sun samples, CROSSING_SEARCH_STEP_KM by default, or 10km when
+                                   crossing_tolerance is None
+        :params geometry : RouteGeometry of the route to reuse
+        :params geometry_backend : "ellipsoidal" or "spherical", see route_geometry.GEOMETRY_BACKENDS
+    * return dict with
+        crossings : list of dicts with type (name of the crossing), altitude (degrees), lat, long, timestamp
+                    and datetime, in route order
+        phase_durations : dict of phase name (see PHASE_NAMES) to seconds spent in it
+
+    The altitude profile is sampled once for all thresholds, and every crossing of every threshold
+    is refined in the same vectorized root search, so the cost stays close to one threshold's.
+    """
+    thresholds = sorted(times if thresholds is None else thresholds, key=lambda threshold: threshold[0])
+    altitudes_deg = [threshold[0] for threshold in thresholds]
+    threshold_rad = rad * np.array(altitudes_deg, dtype=float)
+
+    start_timestamp = parse_timestamp(start_datetime)
+    total_duration = _timedelta_seconds(parse_timestamp(end_datetime) - start_timestamp)
+    if geometry is None:
+        geometry = RouteGeometry((start_latitide, start_longitude), (end_latitude, end_longitude), geometry_backend)
+    route_length = geometry.route_length
+    altitude_at = get_route_altitude_function(geometry.line, start_timestamp, total_duration)
+
+    # altitude profile from departure to arrival
+    if sampling_step_km is None:
+        sampling_step_km = 10 if crossing_tolerance is None else CROSSING_SEARCH_STEP_KM
+    sample_distances, sample_latitudes, sample_longitudes = geometry.get_sample_points(sampling_step_km)
+    distances = np.concatenate([[0.0], sample_distances])
+    altitudes = np.concatenate([
+        getPositions(start_timestamp, start_latitide, start_longitude)["altitude"].reshape(1),
+        altitude_at(sample_distances, positions=(sample_latitudes, sample_longitudes))])
+
+    # (threshold, sample) pairs between which the altitude crosses a threshold
+    above = altitudes[None, :] > threshold_rad[:, None]
+    threshold_index, sample_index = np.nonzero(above[:, :-1] != above[:, 1:])
+    rising = above[threshold_index, sample_index + 1]
+
+    if crossing_tolerance is not None and threshold_index.size and total_duration:
+        xtol = crossing_tolerance * route_length / total_duration
+        crossing_distances = refine_crossings(
+            lambda x, index: altitude_at(x) - threshold_rad[threshold_index[index]],
+            distances[sample_index], distances[sample_index + 1],
+            altitudes[sample_index] - threshold_rad[threshold_index],
+            altitudes[sample_index + 1] - threshold_rad[threshold_index], xtol)
+    else:
+        crossing_distances = distances[sample_index + 1]
+    latitudes, longitudes = get_line_positions(geometry.line, crossing_distances)
+    seconds = total_duration * crossing_distances / route_length if route_length else 0 * crossing_distances
+
+    # route order, a rising sun crossing the lower thresholds first when several share a distance
+    order = np.lexsort((np.where(rising, threshold_index, -threshold_index), crossing_distances))
+    crossings = []
+    for i in order.tolist():
+        threshold = thresholds[threshold_index[i]]
+        timestamp = start_timestamp + float(seconds[i])
+        crossings.append({
+            "type": threshold[1] if rising[i] else threshold[2],
+            "altitude": threshold[0],
+            "lat": float(latitudes[i]),
+            "long": float(longitudes[i]),
+            "timestamp": timestamp,
+            "datetime": datetime.fromtimestamp(timestamp, timezone.utc),
+        })
+
+    # time spent in every band between two consecutive thresholds
+    bounds = [None] + altitudes_deg + [None]
+    band_seconds = [0.0] * (len(thresholds) + 1)
+    band = int(above[:, 0].sum())
+    previous = 0.0
+    for i in order.tolist():
+        band_seconds[band] += float(seconds[i]) - previous
+        previous = float(seconds[i])
+        band += 1 if rising[i] else -1
+    band_seconds[band] += total_duration - previous
+    phase_durations = {}
+    for index, band_time in enumerate(band_seconds):
+        name = _get_phase_name(bounds[index], bounds[index + 1])
+        phase_durations[name] = phase_durations.get(name, 0.0) + band_time
+    return {"crossings": crossings, "phase_durations": phase_durations}
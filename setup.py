@@ -15,12 +15,16 @@ setup(
     author_email='verma.anushka10@gmail.com',
     url='https://github.com/Anushka1002/flight_locator.git',
     license='',
+    entry_points={
+        'console_scripts': ['flight-route-plotter = flight_route_plotter.cli:main'],
+    },
+    python_requires='>=3.9',
     install_requires=[
-        'asgiref==3.2.7',
-        'astral==2.2',
-        'geographiclib==1.50',
-        'geopy==1.22.0',
-        'pytz==2020.1',
-        'sqlparse==0.3.1',
-    ]
+        'geographiclib>=1.50',
+        'numpy>=1.16',
+    ],
+    extras_require={
+        'arrow': ['pyarrow>=1.0'],
+        'jit': ['numba>=0.50'],
+    }
 )